@@ -63,5 +63,19 @@ def debug_lead(name_query):
     else:
         print(f"Failed to fetch metadata: {res_meta.status_code} {res_meta.text}")
 
+    # 4. Conditional GET: the second fetch should get a 304 and reuse the cached record
+    print("\n--- [Test 4] Lead details revalidation (If-Modified-Since) ---")
+    first = agent.zoho.get_lead_details(lead_id)
+    res_cond = agent.zoho._request("GET", f"{agent.zoho.api_domain}/crm/v2/Leads/{lead_id}",
+                                   headers={"If-Modified-Since": first.get("Modified_Time", "")})
+    print(f"Conditional GET status: {res_cond.status_code}")
+    second = agent.zoho.get_lead_details(lead_id)
+    if res_cond.status_code == 304 and second == first:
+        print("304 Not Modified: cached lead returned.")
+    elif second == first:
+        print("Full 200 response with identical data (no 304 from Zoho).")
+    else:
+        print("Lead changed between fetches or revalidation failed.")
+
 if __name__ == "__main__":
     debug_lead("Rakshak")
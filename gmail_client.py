@@ -1,10 +1,14 @@
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import base64
 import json
+import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+logger = logging.getLogger(__name__)
+
 class GmailClient:
     """
     Client for Gmail API.
@@ -20,6 +24,10 @@ class GmailClient:
         self.access_token = None
         self.token_expiry = 0
 
+        # Reuse TCP/TLS connections across calls (keep-alive)
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
     def _refresh_access_token(self):
         """Refreshes the OAuth access token."""
         params = {
@@ -30,16 +38,16 @@ class GmailClient:
         }
         
         try:
-            response = requests.post(self.TOKEN_URI, data=params)
+            response = self._session.post(self.TOKEN_URI, data=params)
             response.raise_for_status()
             data = response.json()
             
             self.access_token = data["access_token"]
             self.token_expiry = time.time() + data.get("expires_in", 3500)
         except requests.exceptions.RequestException as e:
-             print(f"Token Refresh Error: {e}")
-             if hasattr(e, 'response') and e.response:
-                 print(f"Response: {e.response.text}")
+             logger.error("Token Refresh Error: %s", e)
+             if getattr(e, 'response', None) is not None:
+                 logger.error("Response: %s", e.response.text)
              raise e
 
     def _get_headers(self):
@@ -59,7 +67,7 @@ class GmailClient:
         try:
             url = f"{self.API_URL}/messages"
             params = {"q": f"to:{to_email} OR from:{to_email}", "maxResults": 1}
-            response = requests.get(url, headers=self._get_headers(), params=params)
+            response = self._session.get(url, headers=self._get_headers(), params=params)
             response.raise_for_status()
             messages = response.json().get("messages", [])
             
@@ -87,14 +95,14 @@ class GmailClient:
                 "references": new_references
             }
         except Exception as e:
-            print(f"Error finding thread: {e}")
+            logger.error("Error finding thread: %s", e)
             return None
 
     def get_message_details(self, message_id: str):
          """Get details of a specific message to extract Message-ID."""
          try:
             url = f"{self.API_URL}/messages/{message_id}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self._session.get(url, headers=self._get_headers())
             return response.json()
          except:
              return None
@@ -133,14 +141,14 @@ class GmailClient:
                 payload['threadId'] = thread_id
             
             url = f"{self.API_URL}/messages/send"
-            response = requests.post(url, headers=self._get_headers(), json=payload)
+            response = self._session.post(url, headers=self._get_headers(), json=payload)
             response.raise_for_status()
             
-            print(f"Gmail: Sent email to {to_email} (Id: {response.json().get('id')})")
+            logger.info("Gmail: Sent email to %s (Id: %s)", to_email, response.json().get('id'))
             return True
             
         except Exception as e:
-            print(f"Error sending email via Gmail: {e}")
-            if hasattr(e, 'response') and e.response:
-                print(e.response.text)
+            logger.error("Error sending email via Gmail: %s", e)
+            if getattr(e, 'response', None) is not None:
+                logger.error("Response: %s", e.response.text)
             return False
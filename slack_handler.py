@@ -12,7 +12,6 @@ import os
 import json
 import logging
 import threading
-import re
 import requests
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
@@ -23,7 +22,10 @@ from flask import Flask, request
 
 # Import Zoho Agent components
 # safe to import as zoho_agent.py guards main() with if __name__ == "__main__"
-from zoho_agent import agent, draft_manager, get_draft_blocks
+from concurrent.futures import ThreadPoolExecutor
+from zoho_agent import (
+    agent, draft_manager, slack_updates, get_draft_blocks, post_draft, progress_updater, SLACK_POST_WORKERS
+)
 
 # Setup
 load_dotenv()
@@ -77,68 +79,41 @@ def run_check_leads(response_url: str, user_id: str, channel_id: str, client):
         )
 
         # 4. Generate Drafts & Post to Thread
-        for lead in leads:
-            try:
-                # Plan & Generate
-                plan = agent.determine_next_step(lead)
-                
-                if plan['type'] == 'email':
-                    content = agent.generate_email_content(lead, plan)
-                    
-                    # Fallback if generation fails
-                    mock_content = content or {"subject": "Generation Error", "body": "Failed"}
-                    draft_id = draft_manager.save_draft(lead, plan, mock_content)
-                    
-                    if content:
-                        client.chat_postMessage(
-                            channel=channel_id,
-                            thread_ts=thread_ts,
-                            text=f"Draft for {lead.get('Last_Name')}",
-                            blocks=get_draft_blocks(lead, content, draft_id)
-                        )
+        # Plan & Generate (leads are processed concurrently, results arrive in order);
+        # draft cards are posted in the background while later leads generate
+        with ThreadPoolExecutor(max_workers=SLACK_POST_WORKERS) as slack_posts:
+            for lead, plan, content in agent.prepare_drafts(leads):
+                try:
+                    if plan['type'] == 'error':
+                        raise RuntimeError(plan['reason'])
+
+                    if plan['type'] == 'email':
+                        slack_posts.submit(post_draft, client, channel_id, lead, plan, content, thread_ts)
                     else:
-                        # Report Failure
-                         client.chat_postMessage(
+                        # Non-email action (e.g. Review)
+                        client.chat_postMessage(
                             channel=channel_id,
                             thread_ts=thread_ts,
-                            text="⚠️ Generation Failed",
-                            blocks=[
-                                {"type": "section", "text": {"type": "mrkdwn", "text": f"⚠️ *Failed to generate email for {lead.get('First_Name')}*."}},
-                                {
-                                    "type": "actions",
-                                    "elements": [
-                                        {
-                                            "type": "button",
-                                            "text": {"type": "plain_text", "text": "🔄 Try Again"},
-                                            "action_id": "retry_generation",
-                                            "value": draft_id
-                                        }
-                                    ]
-                                }
-                            ]
+                            text=f"ℹ️ *{lead.get('First_Name')} {lead.get('Last_Name')}*: {plan['reason']}"
                         )
-                else:
-                    # Non-email action (e.g. Review)
+                        
+                except Exception as e:
+                    logger.error("Error processing lead %s: %s", lead.get('id'), e)
                     client.chat_postMessage(
                         channel=channel_id,
                         thread_ts=thread_ts,
-                        text=f"ℹ️ *{lead.get('First_Name')} {lead.get('Last_Name')}*: {plan['reason']}"
+                        text=f"❌ Error processing lead: {e}"
                     )
-                    
-            except Exception as e:
-                logger.error(f"Error processing lead {lead.get('id')}: {e}")
-                client.chat_postMessage(
-                    channel=channel_id,
-                    thread_ts=thread_ts,
-                    text=f"❌ Error processing lead: {e}"
-                )
+
+        # Persist drafts now rather than on the debounce timer (Lambda may freeze first)
+        draft_manager.flush()
 
         # Final Update to Parent (Optional - maybe just a reaction?)
         # client.reactions_add(name="white_check_mark", channel=channel_id, timestamp=thread_ts)
 
 
     except Exception as e:
-        logger.error(f"Error in run_check_leads: {e}", exc_info=True)
+        logger.error("Error in run_check_leads: %s", e, exc_info=True)
         requests.post(response_url, json={
             "response_type": "ephemeral",
             "text": f"❌ Error: {str(e)}"
@@ -183,7 +158,8 @@ def handle_approval(ack, body, client):
     channel = body['channel']['id']
 
     if status == "SENT":
-        client.chat_update(
+        slack_updates.update_now(
+            client,
             channel=channel,
             ts=ts,
             text="Email Sent ✅",
@@ -215,23 +191,17 @@ def handle_skip(ack, body, client):
 
     draft_data = draft_manager.get_draft(draft_id)
     if not draft_data:
-        client.chat_update(channel=channel, ts=ts, text="⚠️ Draft expired.")
+        slack_updates.update_now(client, channel=channel, ts=ts, text="⚠️ Draft expired.")
         return
 
     # Update Zoho
-    lead_id = draft_data['lead']['id']
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%dT09:00:00+05:30")
-    
     try:
-        agent.zoho.add_note(lead_id, "Agent: Draft Skipped via Slack. Rescheduled for tomorrow.")
-        agent.zoho.update_lead(lead_id, {
-            "Next_Action_Date": tomorrow,
-            "Next_Action": "Skipped - Retry Tomorrow"
-        })
+        agent.skip_lead(draft_data['lead']['id'])
     except Exception as e:
-        logger.error(f"Skip failed: {e}")
+        logger.error("Skip failed: %s", e)
     
-    client.chat_update(
+    slack_updates.update_now(
+        client,
         channel=channel,
         ts=ts,
         text="Skipped ⏭️",
@@ -307,9 +277,15 @@ def handle_submit_refinement(ack, body, client):
     draft_data = draft_manager.get_draft(draft_id)
     if not draft_data: return
 
+    if not feedback:
+        # Manual edits that change nothing: the message already shows this draft
+        edited = {"subject": new_subject, "body": new_body or ""}
+        if not draft_manager.record_blocks(draft_id, get_draft_blocks(draft_data['lead'], edited, draft_id)):
+            return
+
     # Notify
     loading_msg = "🔄 Regenerating via AI..." if feedback else "💾 Saving Edits..."
-    client.chat_update(
+    slack_updates.schedule_update(client,
         channel=metadata['channel'],
         ts=metadata['ts'],
         text=loading_msg,
@@ -317,18 +293,22 @@ def handle_submit_refinement(ack, body, client):
     )
 
     if feedback:
-        new_content = agent.generate_email_content(draft_data['lead'], draft_data['plan'], feedback)
+        new_content = agent.generate_email_content(
+            draft_data['lead'], draft_data['plan'], feedback,
+            on_progress=progress_updater(client, metadata['channel'], metadata['ts'], loading_msg)
+        )
     else:
         new_content = {"subject": new_subject, "body": new_body}
     
-    draft_manager.drafts[draft_id]['content'] = new_content
-    draft_manager._save_drafts()
+    draft_manager.set_content(draft_id, new_content)
+    blocks = get_draft_blocks(draft_data['lead'], new_content, draft_id)
+    draft_manager.record_blocks(draft_id, blocks)
     
-    client.chat_update(
+    slack_updates.schedule_update(client,
         channel=metadata['channel'],
         ts=metadata['ts'],
         text="Updated Draft",
-        blocks=get_draft_blocks(draft_data['lead'], new_content, draft_id)
+        blocks=blocks
     )
 
 @app.action("retry_generation")
@@ -341,15 +321,19 @@ def handle_retry(ack, body, client):
     ts = body['message']['ts']
     channel = body['channel']['id']
     
-    client.chat_update(channel=channel, ts=ts, text="🔄 Retrying...", blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": "*Retrying...*"}}])
+    slack_updates.schedule_update(client, channel=channel, ts=ts, text="🔄 Retrying...", blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": "*Retrying...*"}}])
     
-    content = agent.generate_email_content(draft_data['lead'], draft_data['plan'])
+    content = agent.generate_email_content(
+        draft_data['lead'], draft_data['plan'],
+        on_progress=progress_updater(client, channel, ts, "Retrying...")
+    )
     if content:
-        draft_manager.drafts[draft_id]['content'] = content
-        draft_manager._save_drafts()
-        client.chat_update(channel=channel, ts=ts, text="Draft", blocks=get_draft_blocks(draft_data['lead'], content, draft_id))
+        draft_manager.set_content(draft_id, content)
+        blocks = get_draft_blocks(draft_data['lead'], content, draft_id)
+        draft_manager.record_blocks(draft_id, blocks)
+        slack_updates.schedule_update(client, channel=channel, ts=ts, text="Draft", blocks=blocks)
     else:
-        client.chat_update(channel=channel, ts=ts, text="Failed", blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": "Failed again."}}])
+        slack_updates.schedule_update(client, channel=channel, ts=ts, text="Failed", blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": "Failed again."}}])
 
 # ==========================================
 # /find-leads — Lead Finder Agent
@@ -464,7 +448,7 @@ def run_find_leads(response_url: str, user_id: str):
         })
 
     except Exception as e:
-        logger.error(f"Error in /find-leads: {e}", exc_info=True)
+        logger.error("Error in /find-leads: %s", e, exc_info=True)
         requests.post(response_url, json={"response_type": "ephemeral", "text": f"❌ Error: {str(e)}"})
 
 def find_leads_ack(ack): ack()
@@ -490,10 +474,9 @@ def run_update_context(response_url: str):
         updated_count = 0
         details = []
 
-        # 2. Update each lead
-        for lead in leads:
+        # 2. Update each lead (batched into shared Claude calls, results arrive in order)
+        for lead, success, result in agent.update_lead_contexts_bulk(leads):
             name = f"{lead.get('First_Name')} {lead.get('Last_Name')}"
-            success, result = agent.update_lead_context(lead)
             
             if success and isinstance(result, dict) and result:
                 updated_count += 1
@@ -513,7 +496,7 @@ def run_update_context(response_url: str):
         requests.post(response_url, json={"text": msg})
 
     except Exception as e:
-        logger.error(f"Error in run_update_context: {e}")
+        logger.error("Error in run_update_context: %s", e)
         requests.post(response_url, json={"text": f"❌ Error updating context: {str(e)}"})
 
 @app.command("/update")
@@ -534,7 +517,11 @@ handler = SlackRequestHandler(app)
 
 @flask_app.route("/slack/events", methods=["POST"])
 def slack_events():
-    return handler.handle(request)
+    response = handler.handle(request)
+    # Lambda may freeze before the debounced writes/updates run
+    slack_updates.flush()
+    draft_manager.flush()
+    return response
 
 @flask_app.route("/health", methods=["GET"])
 def health():
@@ -7,21 +7,45 @@ Interactively manages sales follow-ups via Slack.
 import os
 import json
 import logging
+import logging.handlers
+import queue
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
 
 # Third-party imports
 import time
 import uuid
+import hashlib
+import shelve
+import atexit
+import threading
 import re
+import heapq
+import bisect
+from itertools import islice
 import requests
 import anthropic
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
+# Optional: HTTP/2 for Claude calls needs the h2 package (httpx[http2])
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# Optional: C-accelerated JSON for the draft store (falls back to stdlib json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Local imports
-from zoho_client import ZohoClient
+from zoho_client import ZohoClient, ZohoCircuitOpen, TRANSPORT_ERRORS, HTTP_ERRORS
 from gmail_client import GmailClient
 
 # Setup Logging
@@ -31,6 +55,10 @@ logger = logging.getLogger(__name__)
 # Load Config
 load_dotenv()
 
+# Verbose per-email / prompt debug output (DEBUG=1)
+if os.getenv("DEBUG", "").lower() in ("1", "true", "yes"):
+    logger.setLevel(logging.DEBUG)
+
 ZOHO_CLIENT_ID = os.getenv("ZOHO_CLIENT_ID")
 ZOHO_CLIENT_SECRET = os.getenv("ZOHO_CLIENT_SECRET")
 ZOHO_REFRESH_TOKEN = os.getenv("ZOHO_REFRESH_TOKEN")
@@ -49,71 +77,452 @@ SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
 SLACK_CHANNEL = os.getenv("SLACK_CHANNEL")
 
+# Precompiled patterns for email body cleaning
+_RE_HTML = re.compile(r'<[^>]+>')
+_RE_HTML_TAG = re.compile(r'<[^<]+?>')  # Slack draft rendering
+_RE_WS = re.compile(r'\s+')
+# Literal "\n" escapes / CRLF in AI output -> "\n"; newlines -> <br> for HTML sends
+_RE_NL_NORMALIZE = re.compile(r'\r?\\n|\r\n')
+_RE_NL_TO_BR = re.compile(r'\r\n|\n')
+_RE_CODE_FENCE = re.compile(r'```(?:json)?\s*')  # Markdown fences around AI JSON
+_RE_QUOTE = re.compile(r'(?:-----original|from:\s+.*?\s+sent:\s+|on\s+.*?\s+wrote:)', re.IGNORECASE | re.DOTALL)
+MAX_CLEAN_CHARS = 20000
+
+# Max concurrent Zoho email-content fetches per lead (keeps us under API rate limits)
+EMAIL_FETCH_WORKERS = 5
+
+# Claude calls: SDK retries (exponential backoff on 429/5xx/connection errors)
+# and how many leads are processed concurrently (keep within the tier's RPM)
+LLM_MAX_RETRIES = 3
+LLM_WORKERS = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "4"))
+
+# Structured output for update_lead_context (forced tool call instead of free-form JSON)
+LEAD_STATUS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "last_conversation_summary": {"type": "string", "description": "One-sentence summary of the last interaction"},
+        "last_conversation_date": {"type": "string", "format": "date", "description": "YYYY-MM-DD"},
+        "next_action": {"type": "string", "description": "Next logical action for this lead"},
+        "next_action_date": {"type": "string", "format": "date", "description": "YYYY-MM-DD"},
+    },
+    "required": ["last_conversation_summary", "last_conversation_date", "next_action", "next_action_date"],
+}
+LEAD_STATUS_TOOL = {
+    "name": "update_lead_status",
+    "description": "Record the lead's last interaction and proposed next action.",
+    "input_schema": LEAD_STATUS_SCHEMA,
+}
+# Same fields for several leads in one call (update_lead_contexts_bulk)
+LEAD_STATUS_BULK_TOOL = {
+    "name": "update_lead_statuses",
+    "description": "Record the last interaction and proposed next action for each lead.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "leads": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"lead_id": {"type": "string"}, **LEAD_STATUS_SCHEMA["properties"]},
+                    "required": ["lead_id", *LEAD_STATUS_SCHEMA["required"]],
+                },
+            },
+        },
+        "required": ["leads"],
+    },
+}
+LEAD_STATUS_BATCH_SIZE = 8
+# Leads of one batch whose notes/emails are fetched at the same time
+CONTEXT_FETCH_WORKERS = 4
+# Rough per-lead input budget for the status-update prompt (~4 chars per token)
+CONTEXT_TOKEN_BUDGET = 1500
+MAX_DESC_CHARS = 800
+
+# Interactive regenerations stream from Claude; the Slack placeholder is refreshed
+# at most once per interval (chat.update is rate limited per channel)
+STREAM_UPDATE_INTERVAL = 1.0
+
+# Placeholder/progress/final chat_update calls for one message are coalesced
+# (last write wins) and flushed at most this often
+SLACK_UPDATE_DEBOUNCE = 0.25
+
+# Draft cards posted to Slack concurrently (chat.postMessage allows ~1/s per channel)
+SLACK_POST_WORKERS = 2
+
+# Opt-in: generate check-leads drafts via the Message Batches API (50% cheaper,
+# but results can take minutes), polling every BATCH_POLL_SECONDS
+USE_MESSAGE_BATCHES = os.getenv("ANTHROPIC_USE_BATCHES", "false").lower() == "true"
+BATCH_POLL_SECONDS = 10
+BATCH_TIMEOUT_SECONDS = 3600
+
+# Columns actually read by the agent (Zoho returns "id" regardless)
+LEAD_FIELDS = (
+    "First_Name,Last_Name,Company,Email,Description,Project_Description,Project_Name,"
+    "Last_Conversation,Next_Action,Next_Action_Date,Last_Activity_Time,Created_Time,Reachout_Plan_Status"
+)
+NOTE_FIELDS = "Created_Time,Note_Content"
+
+# TTLs (seconds) for Zoho reads cached within an agent run
+LEADS_CACHE_TTL = 60
+EMAILS_CACHE_TTL = 60
+NOTES_CACHE_TTL = 300
+
+# Reachout_Plan_Status values that take a lead out of the active pool
+_EXCLUDED_STATUSES = frozenset({"Closed", "Junk_Lead", "Dead", "Analysis_Completed"})
+
+# On-disk cache of email bodies (immutable per message_id), bounded by age and entry count
+EMAIL_CACHE_PATH = os.getenv("ZOHO_EMAIL_CACHE_PATH", ".zoho_email_cache")
+EMAIL_CACHE_MAX_ENTRIES = 5000
+EMAIL_CACHE_MAX_AGE = 30 * 86400  # seconds
+EMAIL_CACHE_PRUNE_INTERVAL = 86400  # prune at most this often, on a write
+
+# Per-lead signature of the context last sent to the status-update prompt
+CONTEXT_SIG_PATH = os.getenv("ZOHO_CONTEXT_SIG_PATH", ".zoho_context_sigs")
+
+# Fallbacks if company_context.md / system_prompt.md can't be read
+DEFAULT_COMPANY_CONTEXT = "Digital Agents Interactive - Immersive Tech Company."
+DEFAULT_PROMPT = """
+              Act as a BDR for: {company_context}
+              Lead: {name} from {company}.
+              Description & Notes: {full_description}
+              
+              CONTEXT AND STATUS:
+              - Last Interaction: {last_conversation}
+              - Next Action: {next_action} (Due: {next_action_date})
+              
+              LATEST EMAIL CONTEXT: {latest_email_context}
+              History: {history_context}
+              
+              Task: Write a {template} email (Day {day_in_sequence}).
+              {active_context}
+              
+              IMPORTANT: Output the email body in standard text format with normal paragraph breaks (use \\n). 
+              DO NOT escape newline characters as literal "\\n" strings. Just use actual newlines in the JSON string value.
+              Output JSON keys: subject, body.
+              """
+
+# Cold drip sequence: (first_day, last_day, template, days_until_next, plan_extras)
+DRIP_SCHEDULE = [
+    (0, 1, "day_0_intro", 2, {}),
+    (2, 4, "day_2_followup", 5, {}),
+    (7, 10, "day_7_followup", 7, {}),
+    (14, 20, "day_14_value_add", 14, {}),
+    (28, 32, "day_28_check_in", 7, {}),
+    (35, 38, "day_35_bump", 5, {}),
+    (39, 45, "day_40_breakup", 0, {"move_to_newsletter": True}),
+]
+_DRIP_STARTS = [lo for lo, _, _, _, _ in DRIP_SCHEDULE]
+
+def _drip_for_day(day):
+    """Returns (template, next_interval, extras) for a drip day, or (None, 0, {}) between steps."""
+    day = max(day, 0)
+    for lo, hi, template, interval, extras in DRIP_SCHEDULE:
+        if lo <= day <= hi:
+            return template, interval, extras
+    return None, 0, {}
+
+def _drip_interval_after(day):
+    """Days until the next drip email, based on the latest step started on or before `day`."""
+    idx = bisect.bisect_right(_DRIP_STARTS, max(day, 0)) - 1
+    return DRIP_SCHEDULE[max(idx, 0)][3]
+
+def _parse_ymd(s):
+    """Parses the leading YYYY-MM-DD of a Zoho timestamp (much cheaper than strptime)."""
+    return date(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+
+def _email_time(e):
+    """Best-available timestamp of an email row (V3 'time', V2 'Message_Time', or 'sent_time')."""
+    return e.get('time') or e.get('Message_Time') or e.get('sent_time') or ''
+
+def _email_direction(e):
+    """'RECEIVED' for mail from the lead, else 'SENT' (V3 rows carry 'sent' and 'status')."""
+    status_list = e.get('status') or []
+    status_type = status_list[0].get('type', 'Unknown') if status_list else 'Unknown'
+    if e.get('sent', True) is False or status_type.lower() in ['received', 'incoming']:
+        return 'RECEIVED'
+    return 'SENT'
+
+# Email cache index entry holding the last prune time
+_PRUNED_AT_KEY = "__pruned_at__"
+
+def _open_store(path, label):
+    """Opens a shelve at path, or a plain dict if the path isn't writable (e.g. read-only Lambda filesystem)."""
+    try:
+        return shelve.open(path, writeback=False)
+    except Exception as e:
+        logger.warning("%s unavailable at %s, using memory only: %s", label, path, e)
+        return {}
+
+def _plain_body(body):
+    """Strips basic HTML from an email body for display in Slack."""
+    return _RE_HTML_TAG.sub('', body).strip()
+
+def _approx_tokens(text):
+    return len(text) // 4 + 1
+
+def _fit_to_budget(fixed, notes, emails, max_tokens=CONTEXT_TOKEN_BUDGET):
+    """
+    Drops entries from the tails of the newest-first notes/emails lists (the
+    longer list first) until fixed text + entries fit the token estimate.
+    """
+    notes, emails = list(notes), list(emails)
+    total = _approx_tokens(fixed) + sum(map(_approx_tokens, notes)) + sum(map(_approx_tokens, emails))
+    while total > max_tokens and (notes or emails):
+        dropped = (emails if len(emails) >= len(notes) else notes).pop()
+        total -= _approx_tokens(dropped)
+    return notes, emails
+
+def _json_loads(data):
+    """Parses JSON from str or bytes."""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def _json_dumps(obj, indent=False, sort_keys=False):
+    """Serializes obj to UTF-8 JSON bytes."""
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, sort_keys=sort_keys).encode()
+
+def _try_read(path, default):
+    """Returns the file's contents, or default if it can't be read."""
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except Exception:
+        return default
+
 # Initialize Slack App
 app = App(token=SLACK_BOT_TOKEN)
 
+# Debounce window (seconds) for writing pending_drafts.json
+DRAFT_FLUSH_DELAY = 0.5
+
 # Global State to store drafts temporarily
 class DraftManager:
+    """
+    Persists pending drafts to disk.
+    Lead payloads are stored once in `self.leads` (keyed by lead id) and each
+    draft in `self.drafts` only references its lead via `lead_id`.
+    """
     def __init__(self, filepath="pending_drafts.json"):
         self.filepath = filepath
+        # Mutations mark the store dirty; a background thread coalesces them
+        # into one write per DRAFT_FLUSH_DELAY window
+        self._lock = threading.RLock()
+        self._dirty = threading.Event()
         self._load_drafts()
+        threading.Thread(target=self._flush_loop, name="draft-flusher", daemon=True).start()
+        atexit.register(self._flush_now)
 
     def _load_drafts(self):
         try:
             if os.path.exists(self.filepath):
-                with open(self.filepath, 'r') as f:
-                    self.drafts = json.load(f)
+                with open(self.filepath, 'rb') as f:
+                    data = _json_loads(f.read())
             else:
-                self.drafts = {}
+                data = {}
         except Exception as e:
-            logging.error(f"Failed to load drafts: {e}")
-            self.drafts = {}
+            logger.error("Failed to load drafts: %s", e)
+            data = {}
 
-    def _save_drafts(self):
-        try:
-            with open(self.filepath, 'w') as f:
-                json.dump(self.drafts, f, indent=2)
-        except Exception as e:
-            logging.error(f"Failed to save drafts: {e}")
+        with self._lock:
+            if "drafts" in data and "leads" in data:
+                self.leads = data["leads"]
+                self.drafts = data["drafts"]
+            else:
+                # Legacy format: {draft_id: {"lead": {...}, "plan": ..., ...}}
+                self.leads = {}
+                self.drafts = {}
+                for did, d in data.items():
+                    lead = d.pop("lead", None) or {}
+                    lead_id = d.get("lead_id") or lead.get("id")
+                    d["lead_id"] = lead_id
+                    self.leads[lead_id] = lead
+                    self.drafts[did] = d
+
+    def _mark_dirty(self):
+        self._dirty.set()
+
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(DRAFT_FLUSH_DELAY)
+            self._flush_now()
+
+    def _flush_now(self):
+        """Writes pending changes to disk (atomically, via a temp file)."""
+        with self._lock:
+            if not self._dirty.is_set():
+                return
+            self._dirty.clear()
+            tmp_path = f"{self.filepath}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(_json_dumps({"leads": self.leads, "drafts": self.drafts}, indent=True))
+                os.replace(tmp_path, self.filepath)
+            except Exception as e:
+                logger.error("Failed to save drafts: %s", e)
+
+    def flush(self):
+        """Forces pending changes to disk (e.g. before a serverless invocation ends)."""
+        self._flush_now()
+
+    def _compact_leads(self):
+        """Drops stored leads that are no longer referenced by any draft."""
+        referenced = {d.get("lead_id") for d in self.drafts.values()}
+        for lead_id in [lid for lid in self.leads if lid not in referenced]:
+            del self.leads[lead_id]
 
     def save_draft(self, lead, plan, content):
         draft_id = str(uuid.uuid4())
-        self.drafts[draft_id] = {
-            "lead": lead,
-            "plan": plan,
-            "content": content,
-            "created_at": time.time(),
-            "lead_id": lead.get("id")
-        }
-        self._save_drafts()
+        lead_id = lead.get("id")
+        # Drop transient in-run data (e.g. _enriched_emails) before persisting
+        plan = {k: v for k, v in plan.items() if not k.startswith("_")}
+        with self._lock:
+            # Keep the latest snapshot of the lead; older drafts share it
+            self.leads[lead_id] = lead
+            self.drafts[draft_id] = {
+                "lead_id": lead_id,
+                "plan": plan,
+                "content": self._with_plain_body(content),
+                "created_at": time.time()
+            }
+        self._mark_dirty()
         return draft_id
 
+    @staticmethod
+    def _with_plain_body(content):
+        """Caches the Slack-ready body on the content dict (read by get_draft_blocks)."""
+        if content and content.get("body") is not None:
+            content["body_plain"] = _plain_body(content["body"])
+        return content
+
+    def set_content(self, draft_id, content):
+        """Replaces a draft's content (e.g. after a retry or refinement)."""
+        with self._lock:
+            self.drafts[draft_id]["content"] = self._with_plain_body(content)
+        self._mark_dirty()
+
+    def record_blocks(self, draft_id, blocks):
+        """
+        Remembers the blocks currently shown for a draft.
+        Returns False if they're identical to the last recorded ones (no update needed).
+        """
+        digest = hashlib.blake2b(_json_dumps(blocks, sort_keys=True), digest_size=16).hexdigest()
+        with self._lock:
+            draft = self.drafts.get(draft_id)
+            if draft is None:
+                return True
+            if draft.get("last_blocks_hash") == digest:
+                return False
+            draft["last_blocks_hash"] = digest
+        self._mark_dirty()
+        return True
+
     def get_draft(self, draft_id):
-        # Refresh from disk if not in memory (handles multi-process updates better)
-        if draft_id not in self.drafts:
-             self._load_drafts()
-        return self.drafts.get(draft_id)
+        with self._lock:
+            # Refresh from disk if not in memory (handles multi-process updates better);
+            # flush first so unsaved local changes aren't lost
+            if draft_id not in self.drafts:
+                self._flush_now()
+                self._load_drafts()
+            draft = self.drafts.get(draft_id)
+            if not draft:
+                return None
+            return {**draft, "lead": self.leads.get(draft.get("lead_id")) or {}}
 
     def delete_draft(self, draft_id):
-        if draft_id in self.drafts:
-            del self.drafts[draft_id]
-            self._save_drafts()
+        with self._lock:
+            if draft_id in self.drafts:
+                del self.drafts[draft_id]
+                self._compact_leads()
+                self._mark_dirty()
 
     def cleanup_old_drafts(self, max_age_seconds=86400): # 24 hours default
         current_time = time.time()
-        to_delete = []
-        for did, data in self.drafts.items():
-            if current_time - data.get("created_at", 0) > max_age_seconds:
-                to_delete.append(did)
-        
-        for did in to_delete:
-            del self.drafts[did]
-        
-        if to_delete:
-            self._save_drafts()
+        with self._lock:
+            to_delete = [did for did, data in self.drafts.items()
+                         if current_time - data.get("created_at", 0) > max_age_seconds]
+            
+            for did in to_delete:
+                del self.drafts[did]
+            
+            if to_delete:
+                self._compact_leads()
+                self._mark_dirty()
 
 draft_manager = DraftManager()
 
+class SlackUpdateCoalescer:
+    """
+    Coalesces chat_update calls per (channel, ts): only the latest pending payload
+    is sent each flush, and payloads identical to the last one sent are dropped.
+    All updates to a message should go through here so they stay ordered; final
+    states (Sent/Skipped) use update_now so a pending progress payload can't follow them.
+    """
+    def __init__(self, interval=SLACK_UPDATE_DEBOUNCE):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._pending: Dict[tuple, tuple] = {}
+        self._last_sent: Dict[tuple, str] = {}
+        self._wake = threading.Event()
+        threading.Thread(target=self._flush_loop, name="slack-updates", daemon=True).start()
+        atexit.register(self.flush)
+
+    def schedule_update(self, client, channel, ts, text, blocks=None):
+        with self._lock:
+            self._pending[(channel, ts)] = (client, text, blocks)
+        self._wake.set()
+
+    def update_now(self, client, channel, ts, text, blocks=None):
+        """
+        Sends a final-state update (Sent/Skipped/expired) immediately, dropping any
+        pending payload for the message so a later flush can't overwrite it.
+        Errors from chat_update propagate.
+        """
+        with self._send_lock:
+            with self._lock:
+                self._pending.pop((channel, ts), None)
+            client.chat_update(channel=channel, ts=ts, text=text, blocks=blocks)
+            self._remember_sent(channel, ts, text, blocks)
+
+    def _remember_sent(self, channel, ts, text, blocks):
+        self._last_sent[(channel, ts)] = self._digest(text, blocks)
+        if len(self._last_sent) > 1000:
+            self._last_sent.pop(next(iter(self._last_sent)))
+
+    @staticmethod
+    def _digest(text, blocks):
+        return hashlib.blake2b(_json_dumps([text, blocks], sort_keys=True), digest_size=16).hexdigest()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        """Sends pending updates now (e.g. before a serverless invocation ends)."""
+        with self._send_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._wake.clear()
+            for (channel, ts), (client, text, blocks) in pending.items():
+                if self._last_sent.get((channel, ts)) == self._digest(text, blocks):
+                    continue
+                try:
+                    client.chat_update(channel=channel, ts=ts, text=text, blocks=blocks)
+                    self._remember_sent(channel, ts, text, blocks)
+                except Exception as e:
+                    logger.error("Slack update failed for %s/%s: %s", channel, ts, e)
+
+slack_updates = SlackUpdateCoalescer()
+
 # ==========================================
 # Core Agent Logic (Refactored from previous version)
 # ==========================================
@@ -121,13 +530,44 @@ draft_manager = DraftManager()
 class ZohoAgentCore:
     def __init__(self):
         self.zoho = ZohoClient(ZOHO_REFRESH_TOKEN, ZOHO_CLIENT_ID, ZOHO_CLIENT_SECRET, ZOHO_API_DOMAIN)
+        # Short-lived cache of Zoho reads: key -> (stored_at, value)
+        self._cache: Dict[tuple, tuple] = {}
+        # Column selection for lead searches; None once Zoho rejects it
+        self._lead_fields = LEAD_FIELDS
+
+        # Persistent stores: email bodies keyed by message_id, a small index of when
+        # each was stored (used for pruning, plus the last prune time), and context
+        # signatures keyed by lead_id. One lock guards all three.
+        self._content_lock = threading.Lock()
+        self._content_cache = _open_store(EMAIL_CACHE_PATH, "Email cache")
+        self._content_index = _open_store(EMAIL_CACHE_PATH + "_index", "Email cache index")
+        self._context_sigs = _open_store(CONTEXT_SIG_PATH, "Context signature store")
+        self._pruned_at = None  # read from the index on the first write
+        atexit.register(self.close)
+
+        # Shared pool for independent Zoho reads issued side by side (notes vs. emails)
+        self._io_pool = ThreadPoolExecutor(max_workers=LLM_WORKERS * 2, thread_name_prefix="zoho-io")
         
+        # Prompt inputs are static for the lifetime of the process
+        self._company_ctx = _try_read("company_context.md", DEFAULT_COMPANY_CONTEXT)
+        self._prompt_template = _try_read("system_prompt.md", DEFAULT_PROMPT)
+
         # Configure AI
         if ANTHROPIC_API_KEY:
-            self.client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+            # One pooled HTTP client for all Claude calls; with HTTP/2 the concurrent
+            # lead workers multiplex over a single connection
+            self.client = anthropic.Anthropic(
+                api_key=ANTHROPIC_API_KEY,
+                max_retries=LLM_MAX_RETRIES,
+                http_client=anthropic.DefaultHttpxClient(
+                    http2=_HTTP2,
+                    timeout=httpx.Timeout(60.0, connect=5.0),
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+                ),
+            )
         else:
             self.client = None
-            logging.warning("No Anthropic API Key found.")
+            logger.warning("No Anthropic API Key found.")
 
         # Configure Email
         if GOOGLE_REFRESH_TOKEN and GOOGLE_CLIENT_ID:
@@ -138,16 +578,75 @@ class ZohoAgentCore:
         else:
             self.email_client = None
 
+    def close(self):
+        """Flushes and closes the on-disk stores."""
+        self._io_pool.shutdown(wait=False)
+        self.zoho.close()
+        with self._content_lock:
+            for store in (self._content_cache, self._content_index, self._context_sigs):
+                if hasattr(store, "close"):
+                    store.close()
+            self._content_cache = {}
+            self._content_index = {}
+            self._context_sigs = {}
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    # ------------------------------------------
+    # Cached Zoho reads
+    # ------------------------------------------
+
+    def _cache_get(self, key, ttl):
+        entry = self._cache.get(key)
+        if entry and time.time() - entry[0] < ttl:
+            return entry[1]
+        return None
+
+    def _cache_set(self, key, val):
+        self._cache[key] = (time.time(), val)
+        return val
+
+    def _invalidate(self, lead_id=None):
+        """Drops cached leads, and the emails/notes of lead_id, after we modify Zoho."""
+        for key in list(self._cache):
+            if key[0] == "leads" or (lead_id and key[1:2] == (lead_id,)):
+                self._cache.pop(key, None)
+
+    def _leads(self):
+        leads = self._cache_get(("leads",), LEADS_CACHE_TTL)
+        if leads is None:
+            leads = self._cache_set(("leads",), self.zoho.get_leads())
+        return list(leads)
+
+    def _emails(self, lead_id, limit=20):
+        key = ("emails", lead_id, limit)
+        emails = self._cache_get(key, EMAILS_CACHE_TTL)
+        if emails is None:
+            emails = self._cache_set(key, self.zoho.get_emails(lead_id, limit=limit))
+        # Copy so callers can re-sort without touching the cached order
+        return list(emails)
+
+    def _notes(self, lead_id):
+        key = ("notes", lead_id)
+        notes = self._cache_get(key, NOTES_CACHE_TTL)
+        if notes is None:
+            notes = self._cache_set(key, self.zoho.get_notes(lead_id, fields=NOTE_FIELDS))
+        return list(notes)
+
     def fetch_active_leads(self, limit=10):
         """Fetches up to 'limit' active leads (not Closed/Junk)."""
         # Fetch latest 200 leads (default sort is usually Created_Time or Modified_Time?)
         # Zoho Agent implementation suggests get_leads() returns recent ones.
-        leads = self.zoho.get_leads()
+        leads = self._leads()
         
         active_leads = []
         for lead in leads:
              status = lead.get("Reachout_Plan_Status", "")
-             if status not in ["Closed", "Junk_Lead", "Dead", "Analysis_Completed"]:
+             if status not in _EXCLUDED_STATUSES:
                  active_leads.append(lead)
                  if len(active_leads) >= limit:
                      break
@@ -156,8 +655,25 @@ class ZohoAgentCore:
     def fetch_pending_leads(self):
         """Fetch leads with action due today."""
         today = datetime.now().strftime("%Y-%m-%d")
-        print("Fetching leads from Zoho...")
-        all_leads = self.zoho.get_leads()
+        logger.info("Fetching leads from Zoho...")
+        # Let Zoho filter on today's Next_Action_Date (the agent writes it with +05:30) and
+        # return only the fields we use; the local check below still applies, and we fall
+        # back to the full list on error.
+        criteria = f"(Next_Action_Date:between:{today}T00:00:00+05:30,{today}T23:59:59+05:30)"
+        try:
+            try:
+                all_leads = self.zoho.get_leads(criteria=criteria, fields=self._lead_fields)
+            except HTTP_ERRORS as e:
+                # 400 with fields= usually means an optional custom column (e.g.
+                # Project_Description) doesn't exist in this org: stop narrowing
+                if not self._lead_fields or e.response.status_code != 400:
+                    raise
+                logger.warning("Lead field selection rejected, fetching all columns: %s", e)
+                self._lead_fields = None
+                all_leads = self.zoho.get_leads(criteria=criteria)
+        except Exception as e:
+            logger.warning("Server-side lead filter failed, filtering locally: %s", e)
+            all_leads = self._leads()
         pending = []
         for lead in all_leads:
             next_date = lead.get("Next_Action_Date")
@@ -168,91 +684,145 @@ class ZohoAgentCore:
     def _clean_email_body(self, content):
         """Removes HTML tags and quoted reply text."""
         if not content: return ""
-        import re as _re
         # Strip HTML
-        text = _re.sub(r'<[^>]+>', ' ', str(content))
-        text = _re.sub(r'\s+', ' ', text).strip()
-        
-        # Strip Quoted Text (Simple heuristics)
-        # 1. "On ... wrote:"
-        # 2. "-----Original"
-        # 3. "From: ... Sent: ... To:"
-        
-        lower_text = text.lower()
+        text = _RE_HTML.sub(' ', str(content))
+        text = _RE_WS.sub(' ', text).strip()
         
-        # List of markers and whether they use regex
-        markers = [
-            ("-----original", False),
-            ("from:", False), # Risky if message starts with "From:", but usually safe for replies
-            ("on ", True) # logical check below
-        ]
-        
-        # Regex for "On ... wrote:"
-        match = _re.search(r'on\s+.*?\s+wrote:', text, _re.IGNORECASE | _re.DOTALL)
-        if match and match.start() > 5:
+        # Cap size so a pathological message can't blow up the quote scan
+        text = text[:MAX_CLEAN_CHARS]
+
+        # Strip Quoted Text at the earliest reply marker (single scan):
+        # "-----Original", Outlook "From: ... Sent:", or "On ... wrote:"
+        match = next((m for m in _RE_QUOTE.finditer(text) if m.start() > 5), None)
+        if match:
             text = text[:match.start()]
-            
-        # Divider style
-        idx = text.find("-----Original")
-        if idx > 5: text = text[:idx]
-            
-        # Outlook style "From: ... Sent:"
-        match = _re.search(r'from:\s+.*?\s+sent:\s+', text, _re.IGNORECASE | _re.DOTALL)
-        if match and match.start() > 5:
-             text = text[:match.start()]
              
         return text.strip()
 
+    def _get_content(self, lead_id, msg_id, owner_id=None):
+        """Email bodies never change, so serve them from the disk cache when possible."""
+        key = str(msg_id)
+        with self._content_lock:
+            cached = self._content_cache.get(key)
+        if isinstance(cached, tuple):  # (stored_at, content) entries from older versions
+            cached = cached[1]
+        if cached:
+            return cached
+
+        content = self.zoho.get_email_content(lead_id, msg_id, owner_id=owner_id)
+        if content:
+            now = time.time()
+            with self._content_lock:
+                self._content_cache[key] = content
+                self._content_index[key] = now
+                if self._pruned_at is None:
+                    self._pruned_at = self._content_index.get(_PRUNED_AT_KEY, 0)
+                if (now - self._pruned_at > EMAIL_CACHE_PRUNE_INTERVAL
+                        or len(self._content_index) > EMAIL_CACHE_MAX_ENTRIES * 1.1):
+                    self._prune_content_cache(now)
+        return content
+
+    def _prune_content_cache(self, now):
+        """
+        Drops email bodies older than EMAIL_CACHE_MAX_AGE, then the oldest beyond
+        EMAIL_CACHE_MAX_ENTRIES. Works from the timestamp index and body keys only,
+        so no body is unpickled; bodies missing from the index go too.
+        Caller holds _content_lock.
+        """
+        try:
+            cutoff = now - EMAIL_CACHE_MAX_AGE
+            ages = {}
+            for key in list(self._content_index.keys()):
+                if key == _PRUNED_AT_KEY:
+                    continue
+                stored_at = self._content_index[key]
+                if stored_at >= cutoff:
+                    ages[key] = stored_at
+                else:
+                    del self._content_index[key]
+            for key in heapq.nsmallest(max(len(ages) - EMAIL_CACHE_MAX_ENTRIES, 0), ages, key=ages.get):
+                del ages[key]
+                del self._content_index[key]
+            for key in list(self._content_cache.keys()):
+                if key not in ages:
+                    del self._content_cache[key]
+            self._content_index[_PRUNED_AT_KEY] = now
+        except Exception as e:
+            logger.warning("Could not prune email cache: %s", e)
+        self._pruned_at = now
+
+    @staticmethod
+    def _context_sig(context_section):
+        """Fingerprint of the context fed to the status-update prompt."""
+        return hashlib.blake2b(context_section.encode(), digest_size=16).hexdigest()
+
+    def _context_unchanged(self, lead_id, sig):
+        """True if the lead was already analyzed with exactly this context."""
+        with self._content_lock:
+            return self._context_sigs.get(str(lead_id)) == sig
+
+    def _remember_context(self, lead_id, sig):
+        with self._content_lock:
+            self._context_sigs[str(lead_id)] = sig
+
+    def _fetch_email_contents(self, lead_id, todo):
+        """
+        Fetches full email content for several messages in parallel.
+        `todo` is a list of (key, message_id, owner_id); returns {key: content}.
+        """
+        if not todo:
+            return {}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(EMAIL_FETCH_WORKERS, len(todo))) as ex:
+            futures = {
+                ex.submit(self._get_content, lead_id, msg_id, owner_id=owner_id): key
+                for key, msg_id, owner_id in todo
+            }
+            for fut, key in futures.items():
+                try:
+                    results[key] = fut.result()
+                except Exception as e:
+                    logger.debug("Error fetching email content: %s", e)
+                    results[key] = ""
+        return results
+
     def get_enriched_emails(self, lead_id, limit=5):
         """
         Fetches emails using V3 API, sorts by time, and fetches full content for top emails.
         Returns sorted list of email dicts with 'full_content', '_clean_content', and '_direction' populated.
         """
-        emails = self.zoho.get_emails(lead_id, limit=max(limit, 20))
+        emails = self._emails(lead_id, limit=max(limit, 20))
         if not emails:
             return []
 
-        # Sort by time (V3 'time', V2 'Message_Time', or 'sent_time')
-        def get_time(e):
-             return e.get('time') or e.get('Message_Time') or e.get('sent_time') or ''
-        
+        # Only the newest `limit` emails are needed - O(N log k), leaves the input list untouched
         try:
-            emails.sort(key=get_time, reverse=True)
-        except: pass
+            top = heapq.nlargest(limit, emails, key=_email_time)
+        except:
+            top = emails[:limit]
 
-        enriched = []
-        for e in emails[:limit]:
-            # Populate content if missing
+        # Collect emails whose content is empty or looks like a snippet
+        todo = []
+        for idx, e in enumerate(top):
             content = e.get('content') or e.get('summary') or ""
             msg_id = e.get('message_id') or e.get('id')
             owner_id = str((e.get("owner") or {}).get("id") or "").strip() or None
-            
-            # Decide if we need to fetch full content
-            # If content is empty or looks like a snippet
+            e['full_content'] = content
             if (not content or len(str(content)) < 50) and msg_id:
-                # Fetch full content
-                # print(f"DEBUG: Fetching full content for email {msg_id}...")
-                full = self.zoho.get_email_content(lead_id, msg_id, owner_id=owner_id)
-                if full:
-                    e['full_content'] = full
-                    e['content'] = full # Update main field too
-                else:
-                    e['full_content'] = content
-            else:
-                 e['full_content'] = content
-            
-            e['_sort_time'] = get_time(e)
-            
-            # Determine Direction
-            is_sent = e.get('sent', True) 
-            status_list = e.get('status', [])
-            status_type = status_list[0].get('type', 'Unknown') if status_list else 'Unknown'
-            
-            if is_sent is False or status_type.lower() in ['received', 'incoming']:
-                e['_direction'] = 'RECEIVED'
-            else:
-                e['_direction'] = 'SENT'
-                
+                todo.append((idx, msg_id, owner_id))
+
+        # Fetch full content concurrently
+        for idx, full in self._fetch_email_contents(lead_id, todo).items():
+            if full:
+                top[idx]['full_content'] = full
+                top[idx]['content'] = full # Update main field too
+
+        enriched = []
+        for e in top:
+            e['_sort_time'] = _email_time(e)
+            e['_direction'] = _email_direction(e)
+
             e['_clean_content'] = self._clean_email_body(e.get('full_content'))
             
             enriched.append(e)
@@ -261,15 +831,15 @@ class ZohoAgentCore:
 
     def determine_next_step(self, lead):
         """Same logic as before."""
-        print("figuring out the plan, AAAA")
+        logger.debug("Determining next step for lead %s", lead.get("id"))
         status = lead.get("Reachout_Plan_Status", "Not Active")
         created_time = lead.get("Created_Time", "")
         lead_id = lead.get("id")
+        today = date.today()
         
         try:
             c_time = lead.get("Created_Time") or ""
-            created_dt = datetime.strptime(c_time[:10], "%Y-%m-%d")
-            days_since_creation = (datetime.now() - created_dt).days
+            days_since_creation = (today - _parse_ymd(c_time)).days
         except:
             days_since_creation = 0
 
@@ -280,47 +850,53 @@ class ZohoAgentCore:
         # ----------------------------------------------------
         try:
             emails = self.get_enriched_emails(lead_id, limit=5)
+            # Handed to generate_email_content so it doesn't refetch the same emails
+            plan["_enriched_emails"] = emails
             latest_incoming = None
             latest_sent = None
             latest_email = None
             days_since_reply = 999
             
             if emails:
-                print(f"\nDEBUG: === EMAIL ANALYSIS FOR LEAD {lead_id} ===")
-                print(f"DEBUG: Total emails found: {len(emails)}")
-                
-                for i, e in enumerate(emails[:5]):
-                    print(f"DEBUG: Email {i}: [{e.get('_direction')}] | Time: {e.get('_sort_time')[:19]} | Subj: {e.get('subject', 'No Subject')}")
+                logger.debug("=== EMAIL ANALYSIS FOR LEAD %s === Total emails found: %d", lead_id, len(emails))
+                debug_on = logger.isEnabledFor(logging.DEBUG)
                 
                 latest_email = emails[0]
-                # Find the most recent RECEIVED email
-                latest_incoming = next((e for e in emails if e.get('_direction') == 'RECEIVED'), None)
-                # Find the most recent SENT email
-                latest_sent = next((e for e in emails if e.get('_direction') == 'SENT'), None)
+                # Single pass: most recent RECEIVED and most recent SENT email
+                for i, e in enumerate(emails):
+                    direction = e.get('_direction')
+                    sort_time = e.get('_sort_time', '')
+                    if direction == 'RECEIVED':
+                        if latest_incoming is None or sort_time > latest_incoming.get('_sort_time', ''):
+                            latest_incoming = e
+                    elif direction == 'SENT':
+                        if latest_sent is None or sort_time > latest_sent.get('_sort_time', ''):
+                            latest_sent = e
+                    if debug_on and i < 5:
+                        logger.debug("Email %d: [%s] | Time: %s | Subj: %s", i, direction, sort_time[:19], e.get('subject', 'No Subject'))
                 
                 if latest_incoming:
                     msg_time = latest_incoming.get('_sort_time', '')[:10]
                     try:
-                        msg_dt = datetime.strptime(msg_time, "%Y-%m-%d")
-                        days_since_reply = (datetime.now() - msg_dt).days
+                        days_since_reply = (today - _parse_ymd(msg_time)).days
                     except Exception as date_err:
-                        print(f"DEBUG: Error parsing date '{msg_time}': {date_err}")
+                        logger.debug("Error parsing date '%s': %s", msg_time, date_err)
                         days_since_reply = 0
                     
-                    print(f"DEBUG: Lead last replied {days_since_reply} days ago")
+                    logger.debug("Lead last replied %s days ago", days_since_reply)
                 else:
-                    print("DEBUG: No incoming emails found from lead in recent history.")
+                    logger.debug("No incoming emails found from lead in recent history.")
             
             # Logic Branches
             # ACTIVE only if the latest email in thread is from the lead (unanswered incoming).
             if latest_incoming and days_since_reply <= 7 and latest_email and latest_email.get('_direction') == 'RECEIVED':
                 # ACTIVE: Lead replied recently
-                print(f"\nDEBUG: *** EMAIL TYPE: ACTIVE RESPONSE ***")
+                logger.debug("*** EMAIL TYPE: ACTIVE RESPONSE ***")
                 
                 # Use cleaned content from helper
                 reply_content = latest_incoming.get('_clean_content') or latest_incoming.get('summary') or "No content found."
                 
-                print(f"DEBUG: Lead's message (cleaned): {reply_content[:300]}")
+                logger.debug("Lead's message (cleaned): %.300s", reply_content)
                 
                 plan["type"] = "email"
                 plan["template"] = "active_response"
@@ -333,7 +909,7 @@ class ZohoAgentCore:
                 return plan
             elif latest_email and latest_email.get('_direction') == 'SENT' and latest_incoming:
                 # We already replied after the lead's latest message; next action should be follow-up, not active-response.
-                print(f"\nDEBUG: *** EMAIL TYPE: FOLLOW-UP (awaiting response to our latest sent email) ***")
+                logger.debug("*** EMAIL TYPE: FOLLOW-UP (awaiting response to our latest sent email) ***")
                 plan["type"] = "email"
                 plan["template"] = "day_2_followup_pending_question"
                 plan["reason"] = "Latest thread activity is our sent email with pending clarification request"
@@ -346,20 +922,22 @@ class ZohoAgentCore:
                 
             elif latest_incoming and days_since_reply > 14:
                 # RE-ENGAGEMENT: Lead replied but went silent (> 14 days)
-                print(f"\nDEBUG: *** EMAIL TYPE: RE-ENGAGEMENT *** (Lead last replied {days_since_reply} days ago)")
+                logger.debug("*** EMAIL TYPE: RE-ENGAGEMENT *** (Lead last replied %s days ago)", days_since_reply)
                 plan["type"] = "email"
                 plan["template"] = "re_engagement"
                 plan["reason"] = f"Re-engagement - Silent for {days_since_reply} days"
                 return plan
             else:
-                print(f"\nDEBUG: *** EMAIL TYPE: COLD/DRIP ***")
+                logger.debug("*** EMAIL TYPE: COLD/DRIP ***")
                 
+        except (ZohoCircuitOpen,) + TRANSPORT_ERRORS:
+            # Zoho unreachable: no plan rather than a cold drip based on missing history
+            raise
         except Exception as e:
-            print(f"DEBUG: Error in determine_next_step email check: {e}")
-            import traceback; traceback.print_exc()
+            logger.exception("Error in determine_next_step email check: %s", e)
 
         # Fallback to existing Drip Logic (COLD)
-        print(f"DEBUG: Lead {lead_id} status check -> COLD (No recent reply detected)")
+        logger.debug("Lead %s status check -> COLD (No recent reply detected)", lead_id)
         
         if status == "Active":
             plan["type"] = "review"
@@ -368,36 +946,67 @@ class ZohoAgentCore:
             plan["type"] = "email"
             plan["template"] = "nurture_monthly_update"
             plan["reason"] = "Monthly nurture"
-            plan["next_date"] = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+            plan["next_date"] = (today + timedelta(days=30)).strftime("%Y-%m-%d")
         elif status == "Not Active" or not status:
             # Simple schedule
             day = days_since_creation
-            template = None
-            next_interval = 0
-            
-            if day <= 1: template, next_interval = "day_0_intro", 2
-            elif 2 <= day <= 4: template, next_interval = "day_2_followup", 5
-            elif 7 <= day <= 10: template, next_interval = "day_7_followup", 7
-            elif 14 <= day <= 20: template, next_interval = "day_14_value_add", 14
-            elif 28 <= day <= 32: template, next_interval = "day_28_check_in", 7
-            elif 35 <= day <= 38: template, next_interval = "day_35_bump", 5
-            elif 39 <= day <= 45: 
-                template, next_interval = "day_40_breakup", 0
-                plan["move_to_newsletter"] = True
+            template, next_interval, extras = _drip_for_day(day)
             
             if template:
+                plan.update(extras)
                 plan["type"] = "email"
                 plan["template"] = template
                 plan["reason"] = f"Cold Drip Sequence Day {day}"
                 if next_interval > 0:
-                    plan["next_date"] = (datetime.now() + timedelta(days=next_interval)).strftime("%Y-%m-%d")
+                    plan["next_date"] = (today + timedelta(days=next_interval)).strftime("%Y-%m-%d")
         
         return plan
 
-    def generate_email_content(self, lead, plan, feedback=None):
-        """Generates email content using Claude (Anthropic)."""
-        if not self.client or not plan.get("template"): return None
-        
+    def prepare_drafts(self, leads):
+        """
+        Plans and generates drafts for several leads concurrently (each lead is
+        Zoho + Claude I/O bound). Yields (lead, plan, content) in lead order as
+        results become ready; content is None for non-email plans or failed
+        generations, and plan["type"] is "error" if processing the lead raised.
+        With USE_MESSAGE_BATCHES, emails are generated through one Message
+        Batches request instead (falling back to per-lead calls on failure).
+        """
+        def _plan(lead):
+            try:
+                return lead, self.determine_next_step(lead)
+            except Exception as e:
+                logger.exception("Error processing lead %s", lead.get("id"))
+                return lead, {"type": "error", "reason": str(e), "lead_id": lead.get("id")}
+
+        def _one(lead):
+            lead, plan = _plan(lead)
+            try:
+                content = self.generate_email_content(lead, plan) if plan['type'] == 'email' else None
+            except Exception as e:
+                logger.exception("Error processing lead %s", lead.get("id"))
+                return lead, {"type": "error", "reason": str(e), "lead_id": lead.get("id")}, None
+            return lead, plan, content
+
+        with ThreadPoolExecutor(max_workers=LLM_WORKERS) as ex:
+            if not (USE_MESSAGE_BATCHES and self.client):
+                yield from ex.map(_one, leads)
+                return
+
+            planned = list(ex.map(_plan, leads))
+            to_generate = [(l, p) for l, p in planned if p['type'] == 'email' and p.get("template")]
+            try:
+                contents = self.generate_email_content_batch(to_generate, executor=ex)
+            except Exception as e:
+                logger.error("Message batch failed, generating per lead: %s", e)
+                contents = dict(zip(
+                    (str(l["id"]) for l, _ in to_generate),
+                    ex.map(lambda lp: self.generate_email_content(*lp), to_generate),
+                ))
+            for lead, plan in planned:
+                yield lead, plan, contents.get(str(lead.get("id")))
+
+    def _build_email_prompt(self, lead, plan, feedback=None):
+        """Builds the Claude prompt for a lead's next email (fetches notes/emails as needed)."""
         # Context Gathering
         name = f"{lead.get('First_Name', '')} {lead.get('Last_Name', '')}".strip()
         company = lead.get("Company", "")
@@ -421,103 +1030,115 @@ class ZohoAgentCore:
         # Calculate Day in Sequence
         created_time = lead.get("Created_Time") or ""
         try:
-            created_dt = datetime.strptime(created_time[:10], "%Y-%m-%d")
-            day_in_sequence = (datetime.now() - created_dt).days
+            day_in_sequence = (date.today() - _parse_ymd(created_time)).days
         except:
             day_in_sequence = 0
 
-        print(f"   Fetching context for {name}...")
-        notes = self.zoho.get_notes(lead_id)
-        emails = self.zoho.get_emails(lead_id, limit=20)
-        
-        # Get FULL content
-        notes_text = ""
-        if notes:
-            notes_text = "\n".join([f"- [{n.get('Created_Time')[:10]}] Note: {n.get('Note_Content')}" for n in notes[:5]])
+        logger.info("Fetching context for %s...", name)
+        # Notes load in the background while emails are fetched below
+        notes_future = self._io_pool.submit(self._notes, lead_id)
         
         emails_text = ""
         latest_email_context = "None"
-        
-        if emails:
-            # Sort by best-available timestamp descending.
-            try:
-                emails.sort(
-                    key=lambda x: x.get("time") or x.get("sent_time") or x.get("Message_Time") or "",
-                    reverse=True
-                )
-            except:
-                pass
-                
-            # Take up to 5 recent emails for history context
-            recent_emails = emails[:5]
-            emails_text_list: List[str] = []
-            
-            # Fetch content for the LATEST email (Index 0)
+        enriched = plan.get("_enriched_emails")
+
+        if enriched is not None:
+            # Reuse the emails determine_next_step already fetched and cleaned
+            emails = enriched
             if emails:
                 latest_email = emails[0]
-                l_id = latest_email.get("message_id")  # Correct field name from Zoho list API
-                l_owner_id = str((latest_email.get("owner") or {}).get("id") or "").strip() or None
-                l_is_sent = latest_email.get("sent", True)
-                l_sender = "AGENT" if l_is_sent else "LEAD"
-                print(f"DEBUG: Fetching content for LATEST email: {latest_email.get('subject')} ({l_id}) | From: {l_sender}")
+                l_sender = "LEAD" if latest_email.get("_direction") == "RECEIVED" else "AGENT"
+                l_content = latest_email.get("_clean_content") or latest_email.get("summary") or "No content found"
+
+                latest_email_context = "\n".join([
+                    f"[{latest_email.get('_sort_time', '')[:10]}] {l_sender}: {latest_email.get('subject')}",
+                    "BODY:",
+                    l_content[:1500],
+                ])
+
+                emails_text = "\n".join(
+                    f"- [{e.get('_sort_time', '')[:10]}] {'LEAD' if e.get('_direction') == 'RECEIVED' else 'AGENT'}: "
+                    f"{e.get('subject', 'No Subject')} - {(e.get('_clean_content') or 'No content')[:200]}..."
+                    for e in emails[:5]
+                )
+        else:
+            emails = self._emails(lead_id, limit=20)
+        
+            if emails:
+                # Take up to 5 recent emails (by best-available timestamp) for history context
+                try:
+                    recent_emails = heapq.nlargest(
+                        5, emails,
+                        key=lambda x: x.get("time") or x.get("sent_time") or x.get("Message_Time") or ""
+                    )
+                except:
+                    recent_emails = emails[:5]
+                emails_text_list: List[str] = []
+
+                # Fetch content for all recent emails concurrently (message_id is the Zoho list API field)
+                contents = self._fetch_email_contents(lead_id, [
+                    (i, e.get("message_id"), str((e.get("owner") or {}).get("id") or "").strip() or None)
+                    for i, e in enumerate(recent_emails) if e.get("message_id")
+                ])
+            
+                # Content for the LATEST email (Index 0)
+                if recent_emails:
+                    latest_email = recent_emails[0]
+                    l_id = latest_email.get("message_id")
+                    l_is_sent = latest_email.get("sent", True)
+                    l_sender = "AGENT" if l_is_sent else "LEAD"
+                    logger.debug("Using content for LATEST email: %s (%s) | From: %s", latest_email.get('subject'), l_id, l_sender)
                 
-                l_content = ""
-                if l_id:
-                    l_content = self.zoho.get_email_content(lead_id, l_id, owner_id=l_owner_id)
-                if not l_content:
-                    l_content = latest_email.get("summary") or "No content found"
+                    l_content = contents.get(0) or ""
+                    if not l_content:
+                        l_content = latest_email.get("summary") or "No content found"
                 
-                latest_email_context = f"""
-                [{(latest_email.get('time') or latest_email.get('sent_time') or '')[:10]}] {l_sender}: {latest_email.get('subject')}
-                BODY:
-                {l_content[:1500]}
-                """
+                    latest_email_context = "\n".join([
+                        f"[{(latest_email.get('time') or latest_email.get('sent_time') or '')[:10]}] {l_sender}: {latest_email.get('subject')}",
+                        "BODY:",
+                        l_content[:1500],
+                    ])
             
-            # History Loop - use correct lowercase field names
-            for e in recent_emails:
-                e_id = e.get("message_id")  # Correct field name
-                e_subj = e.get("subject", "No Subject")
-                e_time = (e.get("time") or e.get("sent_time") or "")[:10]
-                e_owner_id = str((e.get("owner") or {}).get("id") or "").strip() or None
-                e_is_sent = e.get("sent", True)
-                e_dir = "AGENT" if e_is_sent else "LEAD"
+                # History Loop - use correct lowercase field names
+                for i, e in enumerate(recent_emails):
+                    e_id = e.get("message_id")  # Correct field name
+                    e_subj = e.get("subject", "No Subject")
+                    e_time = (e.get("time") or e.get("sent_time") or "")[:10]
+                    e_is_sent = e.get("sent", True)
+                    e_dir = "AGENT" if e_is_sent else "LEAD"
                 
-                # Reuse content if this is the same as the latest email
-                if emails and e.get("message_id") == emails[0].get("message_id"):
-                    emails_text_list.append(f"- [{e_time}] {e_dir}: {e_subj} - {str(l_content)[:200]}...")
-                    continue
+                    # Reuse content if this is the same as the latest email
+                    if e.get("message_id") == latest_email.get("message_id"):
+                        emails_text_list.append(f"- [{e_time}] {e_dir}: {e_subj} - {str(l_content)[:200]}...")
+                        continue
 
-                # Fetch content for others
-                e_content = "Content not available"
-                try:
+                    # Use prefetched content for others
+                    e_content = "Content not available"
                     if e_id:
-                        e_content = self.zoho.get_email_content(lead.get("id"), e_id, owner_id=e_owner_id) or "No content"
-                except: pass
+                        e_content = contents.get(i) or "No content"
                 
-                emails_text_list.append(f"- [{e_time}] {e_dir}: {e_subj} - {str(e_content)[:200]}...")
+                    emails_text_list.append(f"- [{e_time}] {e_dir}: {e_subj} - {str(e_content)[:200]}...")
             
-            emails_text = "\n".join(emails_text_list)
+                emails_text = "\n".join(emails_text_list)
 
         
         # DEBUG LOGGING FOR CONTEXT
-        print("\n" + "="*40)
-        print("DEBUG: GENERATE EMAIL CONTEXT ANALYSIS")
-        print("-" * 20)
-        print(f"Fetched {len(emails)} emails total for {name}.")
-        for i, e in enumerate(emails[:5]):
-             e_dir = 'AGENT' if e.get('sent', True) else 'LEAD'
-             e_time = e.get("time") or e.get("sent_time") or ""
-             print(f"DEBUG Email {i}: [{e_dir}] | Time={e_time[:19]} | Subj={e.get('subject', 'N/A')}")
-        print("-" * 20)
-        print("="*40 + "\n")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("GENERATE EMAIL CONTEXT ANALYSIS: fetched %d emails total for %s.", len(emails), name)
+            for i, e in enumerate(emails[:5]):
+                e_dir = 'AGENT' if e.get('sent', True) else 'LEAD'
+                e_time = e.get("time") or e.get("sent_time") or e.get("_sort_time") or ""
+                logger.debug("Email %d: [%s] | Time=%s | Subj=%s", i, e_dir, e_time[:19], e.get('subject', 'N/A'))
         
+        # Get FULL content
+        notes = notes_future.result()
+        notes_text = ""
+        if notes:
+            notes_text = "\n".join([f"- [{n.get('Created_Time')[:10]}] Note: {n.get('Note_Content')}" for n in notes[:5]])
+
         history_context = f"RECENT NOTES:\n{notes_text}\n\nRECENT EMAILS:\n{emails_text}"
 
-        try:
-            with open("company_context.md", "r") as f:
-                company_ctx = f.read()
-        except:
-            company_ctx = "Digital Agents Interactive - Immersive Tech Company."
+        company_ctx = self._company_ctx
 
         # Prepare explicit active context if available from plan
         active_context = ""
@@ -559,32 +1180,9 @@ class ZohoAgentCore:
         elif plan.get("template") in ["day_2_followup", "day_7_followup", "day_14_value_add", "day_28_check_in", "day_35_bump"]:
             email_type_label = "FOLLOW_UP_NO_RESPONSE"
         
-        try:
-            with open("system_prompt.md", "r") as f:
-                prompt_template = f.read()
-        except:
-             # Fallback
-             prompt_template = """
-              Act as a BDR for: {company_context}
-              Lead: {name} from {company}.
-              Description & Notes: {full_description}
-              
-              CONTEXT AND STATUS:
-              - Last Interaction: {last_conversation}
-              - Next Action: {next_action} (Due: {next_action_date})
-              
-              LATEST EMAIL CONTEXT: {latest_email_context}
-              History: {history_context}
-              
-              Task: Write a {template} email (Day {day_in_sequence}).
-              {active_context}
-              
-              IMPORTANT: Output the email body in standard text format with normal paragraph breaks (use \\n). 
-              DO NOT escape newline characters as literal "\\n" strings. Just use actual newlines in the JSON string value.
-              Output JSON keys: subject, body.
-              """
+        prompt_template = self._prompt_template
 
-        prompt = prompt_template.format(
+        prompt_parts = [prompt_template.format(
             company_context=company_ctx,
             name=name,
             company=company,
@@ -601,77 +1199,136 @@ class ZohoAgentCore:
             template=plan['template'],
             active_context=active_context,
             email_type=email_type_label
-        )
+        )]
 
         # Safety rule: don't treat impossible date/time values from lead messages as confirmed.
-        prompt += (
+        prompt_parts.append(
             "\n\nDATE/TIME VALIDATION RULE:\n"
             "- If the lead suggests an impossible date/time (e.g., Feb 29 on a non-leap year, hour > 23),\n"
             "  do NOT confirm it as valid. Politely ask for a corrected slot and optionally suggest valid alternatives.\n"
         )
         
         if feedback:
-            prompt += f"\nREFINE BASED ON FEEDBACK: {feedback}"
+            prompt_parts.append(f"\nREFINE BASED ON FEEDBACK: {feedback}")
+
+        return "".join(prompt_parts)
+
+    def _email_params(self, prompt):
+        """Claude request params for email generation (shared by single and batch calls)."""
+        return {
+            "model": ANTHROPIC_MODEL,
+            "max_tokens": 1024,
+            "temperature": 0.7,
+            "messages": [{"role": "user", "content": prompt}],
+        }
 
-        # Configuration
-        model_name = ANTHROPIC_MODEL
+    @staticmethod
+    def _parse_email_response(raw_response):
+        """Extracts the {"subject", "body"} JSON from Claude's reply."""
+        clean_response = raw_response.strip()
+        if "```" in clean_response:
+            clean_response = _RE_CODE_FENCE.sub('', clean_response)
         
-        # DEBUG LOG
-        print("\n" + "="*40)
-        print(f"DEBUG: AI GENERATION - Model: {model_name}")
-        print("="*40)
-        print("DEBUG: FULL PROMPT SENT TO CLAUDE:")
-        print("-" * 20)
-        print(prompt)
-        print("-" * 20)
-        print("="*40 + "\n")
+        start_idx = clean_response.find('{')
+        end_idx = clean_response.rfind('}')
+        
+        if start_idx != -1 and end_idx != -1:
+            clean_response = clean_response[start_idx:end_idx+1]
 
-        try:
-            message = self.client.messages.create(
-                model=model_name,
-                max_tokens=1024,
-                temperature=0.7,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            raw_response = message.content[0].text
-            clean_response = raw_response.strip()
-            if "```" in clean_response:
-                clean_response = re.sub(r'```json\s*', '', clean_response)
-                clean_response = re.sub(r'```\s*', '', clean_response)
-            
-            start_idx = clean_response.find('{')
-            end_idx = clean_response.rfind('}')
+        result_json = _json_loads(clean_response)
+        
+        # Post-Process: Fix literal '\n' escaping issues if present
+        if result_json.get('body'):
+            # First, ensure legitimate newlines are preserved
+            # If Claude returned literal "\\n", json.loads turns it into "\n".
+            # But if Claude returned "\\\\n", json.loads turns it into "\\n" (literal backslash n).
+            # The user says "old \n \nl types continuous".
+            # Let's try to unescape any residual literal "\n" sequences just in case.
             
-            if start_idx != -1 and end_idx != -1:
-                clean_response = clean_response[start_idx:end_idx+1]
+            # Replace literal "\n" strings (and "\r\n") with actual newlines in a single pass.
+            result_json['body'] = _RE_NL_NORMALIZE.sub('\n', result_json['body'])
 
-            result_json = json.loads(clean_response)
-            
-            # Post-Process: Fix literal '\n' escaping issues if present
-            if result_json.get('body'):
-                # First, ensure legitimate newlines are preserved
-                # If Claude returned literal "\\n", json.loads turns it into "\n".
-                # But if Claude returned "\\\\n", json.loads turns it into "\\n" (literal backslash n).
-                # The user says "old \n \nl types continuous".
-                # Let's try to unescape any residual literal "\n" sequences just in case.
-                
-                body = result_json['body']
-                # Replace literal "\n" string with actual newline character, if somehow escaped.
-                body = body.replace('\\n', '\n') 
-                
-                # Also, sometimes it outputs "\r\n" which is fine, but let's normalize to \n
-                body = body.replace('\r\n', '\n')
-                
-                result_json['body'] = body
+        return result_json
+
+    def generate_email_content(self, lead, plan, feedback=None, on_progress=None):
+        """
+        Generates email content using Claude (Anthropic).
+        If on_progress is given, the response is streamed and on_progress(text_so_far)
+        is called at most every STREAM_UPDATE_INTERVAL seconds.
+        """
+        if not self.client or not plan.get("template"): return None
 
-            return result_json
+        prompt = self._build_email_prompt(lead, plan, feedback)
+
+        # DEBUG LOG
+        logger.debug("AI GENERATION - Model: %s\nFULL PROMPT SENT TO CLAUDE:\n%s", ANTHROPIC_MODEL, prompt)
+
+        try:
+            params = self._email_params(prompt)
+            if on_progress:
+                with self.client.messages.stream(**params) as stream:
+                    chunks: List[str] = []
+                    last_update = time.monotonic()
+                    for text in stream.text_stream:
+                        chunks.append(text)
+                        now = time.monotonic()
+                        if now - last_update >= STREAM_UPDATE_INTERVAL:
+                            last_update = now
+                            on_progress("".join(chunks))
+                    message = stream.get_final_message()
+            else:
+                message = self.client.messages.create(**params)
+            return self._parse_email_response(message.content[0].text)
         except Exception as e:
-            print(f"AI Generation Error: {e}")
+            logger.error("AI Generation Error: %s", e)
             return None # Indicate failure for retry button
 
+    def generate_email_content_batch(self, leads_and_plans, executor=None):
+        """
+        Generates emails for many (lead, plan) pairs with one Message Batches
+        request (half the cost of individual calls, but asynchronous on Anthropic's
+        side). Returns {lead_id: content or None}; raises if the batch can't be
+        created or doesn't finish within BATCH_TIMEOUT_SECONDS.
+        Prompts (each needing Zoho reads) are built concurrently on executor,
+        or on a temporary pool if none is given.
+        """
+        pairs = list(leads_and_plans)
+        if not pairs:
+            return {}
+
+        def _request(lead_plan):
+            lead, plan = lead_plan
+            prompt = self._build_email_prompt(lead, plan)
+            return {"custom_id": str(lead["id"]), "params": self._email_params(prompt)}
+
+        if executor is not None:
+            requests_ = list(executor.map(_request, pairs))
+        else:
+            with ThreadPoolExecutor(max_workers=min(LLM_WORKERS, len(pairs))) as ex:
+                requests_ = list(ex.map(_request, pairs))
+
+        batch = self.client.messages.batches.create(requests=requests_)
+        logger.info("Submitted message batch %s (%d requests)", batch.id, len(requests_))
+
+        deadline = time.monotonic() + BATCH_TIMEOUT_SECONDS
+        while batch.processing_status != "ended":
+            if time.monotonic() > deadline:
+                self.client.messages.batches.cancel(batch.id)
+                raise TimeoutError(f"Message batch {batch.id} did not finish in {BATCH_TIMEOUT_SECONDS}s")
+            time.sleep(BATCH_POLL_SECONDS)
+            batch = self.client.messages.batches.retrieve(batch.id)
+
+        results = {r["custom_id"]: None for r in requests_}
+        for entry in self.client.messages.batches.results(batch.id):
+            if entry.result.type != "succeeded":
+                logger.error("Batch generation failed for lead %s: %s", entry.custom_id, entry.result.type)
+                continue
+            try:
+                results[entry.custom_id] = self._parse_email_response(entry.result.message.content[0].text)
+            except Exception as e:
+                logger.error("AI Generation Error for lead %s: %s", entry.custom_id, e)
+        return results
+
 
         
     # Helper to return SENT/FAILED statuses
@@ -687,49 +1344,45 @@ class ZohoAgentCore:
              try:
                  thread_context = self.email_client.find_last_thread_id(email)
              except Exception as e:
-                 print(f"ERROR: Failed to find thread context: {e}")
+                 logger.error("Failed to find thread context: %s", e)
         
-        formatted_body = content["body"].replace("\n", "<br>")
+        formatted_body = _RE_NL_TO_BR.sub("<br>", content["body"])
         
         try:
             sent = self.email_client.send_email(email, content["subject"], formatted_body, thread_context=thread_context)
             if not sent: return "EMAIL_FAILED"
         except Exception as e:
-            print(f"ERROR: Gmail Send Exception: {e}")
+            logger.error("Gmail Send Exception: %s", e)
             return "EMAIL_FAILED"
         
         # Email Sent - Proceed with Zoho Updates (Best Effort)
         try:
             self.zoho.add_note(lead_id, f"Agent Sent ({plan.get('template', 'Email')}):\n{content['subject']}\n\n{content['body']}")
+            # We just sent an email and added a note - cached history is stale
+            self._invalidate(lead_id)
             
             # --- Logic for Next Steps (Simplified copy of existing logic) ---
             # Fetch full history to determine reply status
-            emails = self.zoho.get_emails(lead_id)
-            print(f"DEBUG: execute_send fetched {len(emails)} emails for {lead_id}")
-            
-            has_replied = False
-            last_reply_date = None
-            if emails:
-                for i, e in enumerate(emails):
-                    direction = str(e.get("Direction") or e.get("direction")).lower()
-                    msg_time = e.get("Message_Time", "")[:10]
-                    subject = e.get("Subject", "No Subject")
-                    
-                    print(f"DEBUG: Email {i} - Dir: {direction} | Time: {msg_time} | Subj: {subject}")
-                    
-                    if direction in ["incoming", "from_contact", "received", "1"]: # Added '1' just in case
-                        has_replied = True
-                        if not last_reply_date or msg_time > last_reply_date:
-                            last_reply_date = msg_time
-                            # Capture snippet for Last_Conversation update
-                            content_body = e.get('Content') or e.get('Body') or ''
-                            last_reply_snippet = f"Customer Replied ({msg_time}): {subject} - {content_body[:100]}..."
-                            updates["Last_Conversation"] = last_reply_snippet
-                            print(f"DEBUG: Detect Reply! Set Last_Conversation to: {last_reply_snippet}")
+            emails = self._emails(lead_id)
+            logger.debug("execute_send fetched %d emails for %s", len(emails), lead_id)
             
             today_date = datetime.now()
+            today = today_date.date()
             updates = {}
             updates["Last_Conversation_Date"] = today_date.strftime("%Y-%m-%dT%H:%M:%S+05:30")
+
+            # Latest reply from the lead, if any (same row classification as get_enriched_emails)
+            incoming = [e for e in emails if _email_direction(e) == 'RECEIVED']
+            latest = max(incoming, key=_email_time, default=None)
+            has_replied = latest is not None
+            last_reply_date = _email_time(latest)[:10] if latest else None
+
+            if latest:
+                # Capture snippet for Last_Conversation update
+                subject = latest.get("subject") or latest.get("Subject") or "No Subject"
+                content_body = self._clean_email_body(latest.get('content') or latest.get('summary') or '')
+                updates["Last_Conversation"] = f"Customer Replied ({last_reply_date}): {subject} - {content_body[:100]}..."
+                logger.debug("Detect Reply! Set Last_Conversation to: %s", updates["Last_Conversation"])
             
             next_action_date = None
             next_action_desc = ""
@@ -738,19 +1391,11 @@ class ZohoAgentCore:
                 # PATH A: Cold Lead
                 created_time = lead.get("Created_Time", "")
                 try:
-                    created_dt = datetime.strptime(created_time[:10], "%Y-%m-%d")
-                    day_in_seq = (today_date - created_dt).days
+                    day_in_seq = (today - _parse_ymd(created_time)).days
                 except:
                     day_in_seq = 0
                 
-                next_interval = 2
-                if day_in_seq < 2: next_interval = 2
-                elif day_in_seq < 7: next_interval = 5
-                elif day_in_seq < 14: next_interval = 7
-                elif day_in_seq < 28: next_interval = 14
-                elif day_in_seq < 35: next_interval = 7
-                elif day_in_seq < 40: next_interval = 5
-                else: next_interval = 0
+                next_interval = _drip_interval_after(day_in_seq)
                 
                 if next_interval > 0:
                     next_date_obj = today_date + timedelta(days=next_interval)
@@ -764,8 +1409,7 @@ class ZohoAgentCore:
                 days_since_reply = 999
                 if last_reply_date:
                     try:
-                        dt = datetime.strptime(last_reply_date, "%Y-%m-%d")
-                        days_since_reply = (today_date - dt).days
+                        days_since_reply = (today - _parse_ymd(last_reply_date)).days
                     except: pass
                 
                 if days_since_reply > 14:
@@ -783,50 +1427,151 @@ class ZohoAgentCore:
             if next_action_desc:
                 updates["Next_Action"] = next_action_desc
 
-            print(f"DEBUG: Updating Zoho with: {updates}")
+            logger.debug("Updating Zoho with: %s", updates)
             self.zoho.update_lead(lead_id, updates)
+            self._invalidate(lead_id)
             
         except Exception as e:
-            print(f"ERROR: Zoho Update Failed (Non-critical): {e}")
+            logger.error("Zoho Update Failed (Non-critical): %s", e)
             
         return "SENT"
 
-    def update_lead_context(self, lead):
+    def skip_lead(self, lead_id):
+        """Records a draft skipped via Slack: note + retry tomorrow at 09:00. Zoho errors propagate."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%dT09:00:00+05:30")
+        try:
+            self.zoho.add_note(lead_id, "Agent: Draft Skipped via Slack. Rescheduled for tomorrow.")
+            self.zoho.update_lead(lead_id, {
+                "Next_Action_Date": tomorrow,
+                "Next_Action": "Skipped - Retry Tomorrow"
+            })
+        finally:
+            # Even a partial write (note only) makes cached reads stale
+            self._invalidate(lead_id)
+
+    def update_lead_contexts_bulk(self, leads, batch_size=LEAD_STATUS_BATCH_SIZE):
         """
-        Analyzes full lead context (Desc, Notes, Emails) using LLM to update:
-        - Last_Conversation (Summary)
-        - Last_Conversation_Date
-        - Next_Action
-        - Next_Action_Date
+        Updates context for many leads, packing up to batch_size leads into each
+        Claude call (fewer round-trips and rate-limit hits than one call per lead).
+        Batches run concurrently; yields (lead, success, result) in lead order.
         """
-        print(f"🔄 Analyzing context for {lead.get('Last_Name')}...")
+        it = iter(leads)
+        chunks = list(iter(lambda: list(islice(it, batch_size)), []))
+
+        def _one(chunk):
+            if len(chunk) == 1:
+                return [(chunk[0], *self.update_lead_context(chunk[0]))]
+            try:
+                return self._update_lead_context_chunk(chunk)
+            except Exception as e:
+                logger.exception("Error in update_lead_contexts_bulk")
+                return [(lead, False, str(e)) for lead in chunk]
+
+        with ThreadPoolExecutor(max_workers=LLM_WORKERS) as ex:
+            for results in ex.map(_one, chunks):
+                yield from results
+
+    def _update_lead_context_chunk(self, leads):
+        """One Claude call for several leads; returns [(lead, success, result)]."""
+        results = {}
+        sigs = {}
+        sections = []
+
+        def _section(lead):
+            try:
+                return self._lead_context_section(lead), None
+            except Exception as e:
+                logger.error("Error fetching context for lead %s: %s", lead.get("id"), e)
+                return None, e
+
+        # Per-lead Zoho reads run side by side. A local pool, because
+        # _lead_context_section itself waits on _io_pool and nesting could starve it.
+        with ThreadPoolExecutor(max_workers=min(len(leads), CONTEXT_FETCH_WORKERS)) as ex:
+            fetched = list(ex.map(_section, leads))
+
+        for lead, (section, error) in zip(leads, fetched):
+            lead_id = lead.get("id")
+            if error is not None:
+                # Reported for this lead only and left out of the prompt
+                results[lead_id] = (lead, False, str(error))
+                continue
+            sigs[lead_id] = self._context_sig(section)
+            if self._context_unchanged(lead_id, sigs[lead_id]):
+                results[lead_id] = (lead, True, "Unchanged")
+                continue
+            sections.append(f"=== LEAD {len(sections) + 1} (lead_id: {lead_id}) ===\n{section}")
+        if not sections:
+            return [results[lead.get("id")] for lead in leads]
+        prompt = f"""
+        Analyze the context of each sales lead below and update its status fields.
+        
+        {chr(10).join(sections)}
+        
+        TASK:
+        For EACH lead, based on its recent notes and emails (especially the Lead's last reply if present):
+        1. Summarize the LAST interaction (email or note) into a short sentence. If the lead replied recently, focus on that over our automated follow-ups.
+        2. Determine the date of that last interaction (YYYY-MM-DD).
+        3. Propose the NEXT logical action (e.g., "Answer question about pricing", "Follow up on proposal") based on the lead's needs.
+        4. Propose a date for that next action (YYYY-MM-DD).
+        
+        Record one entry per lead (with its lead_id) using the update_lead_statuses tool.
+        """
+
+        message = self.client.messages.create(
+            model=ANTHROPIC_MODEL,
+            max_tokens=200 * len(sections),
+            temperature=0.7,
+            tools=[LEAD_STATUS_BULK_TOOL],
+            tool_choice={"type": "tool", "name": LEAD_STATUS_BULK_TOOL["name"]},
+            messages=[{"role": "user", "content": prompt}]
+        )
+        payload = next((b.input for b in message.content if b.type == "tool_use"), None) or {}
+        rows = {str(r.get("lead_id")): r for r in payload.get("leads", []) if isinstance(r, dict)}
+
+        def _apply(lead):
+            lead_id = lead.get("id")
+            if lead_id in results:
+                return results[lead_id]
+            updates = rows.get(str(lead_id))
+            if not updates:
+                return lead, False, "No status returned by AI"
+            try:
+                success, result = self._apply_status_updates(lead, updates)
+            except Exception as e:
+                logger.error("Error updating lead %s: %s", lead_id, e)
+                return lead, False, str(e)
+            self._remember_context(lead_id, sigs[lead_id])
+            return lead, success, result
+
+        # Zoho writes for the batch go out in parallel
+        return list(self._io_pool.map(_apply, leads))
+
+    def _lead_context_section(self, lead):
+        """Fetches notes/emails for a lead and formats them for the status-update prompt."""
         lead_id = lead.get("id")
         
-        # 1. Fetch ALL context
-        notes = self.zoho.get_notes(lead_id)
+        # 1. Fetch ALL context (notes and emails concurrently)
+        notes_future = self._io_pool.submit(self._notes, lead_id)
         # Use helper for robust email fetching (v3 + content)
         emails = self.get_enriched_emails(lead_id, limit=5)
+        notes = notes_future.result()
         
-        print(f"DEBUG: Fetched {len(notes)} notes and {len(emails)} emails for {lead.get('Last_Name')}")
+        logger.debug("Fetched %d notes and %d emails for %s", len(notes), len(emails), lead.get('Last_Name'))
         
         # Format Notes
-        notes_text = "No notes."
-        if notes:
-            notes_text = "\n".join([f"- [{n.get('Created_Time')[:10]}] {n.get('Note_Content')}" for n in notes[:5]])
+        notes_lines = [f"- [{n.get('Created_Time')[:10]}] {str(n.get('Note_Content'))[:600]}" for n in notes[:5]]
 
         # Format Emails & Identify Latest Reply
-        emails_text = "No emails."
+        emails_text_list = []
         latest_interaction_date = None
         latest_received = None
         
         if emails:
-            # Find the most recent RECEIVED email
-            latest_received = next((e for e in emails if e.get('_direction') == 'RECEIVED'), None)
-            
-            emails_text_list = []
+            # Single pass: format lines, track latest interaction and most recent RECEIVED email
             for e in emails[:5]:
                 # Use enriched fields
-                time_str = e.get('_sort_time')[:16]
+                sort_time = e.get('_sort_time', '')
+                time_str = sort_time[:16]
                 direction = e.get('_direction', 'UNKNOWN')
                 subject = e.get('subject', 'No Subject')
                 content = e.get('_clean_content', '')[:600]
@@ -835,8 +1580,8 @@ class ZohoAgentCore:
                 
                 if time_str and (not latest_interaction_date or time_str > latest_interaction_date):
                     latest_interaction_date = time_str
-            
-            emails_text = "\n".join(emails_text_list)
+                if direction == 'RECEIVED' and (latest_received is None or sort_time > latest_received.get('_sort_time', '')):
+                    latest_received = e
 
         # Build "Last Key Reply" section for prompt
         last_reply_section = ""
@@ -851,12 +1596,14 @@ class ZohoAgentCore:
         # Current Description
         desc_standard = lead.get("Description") or ""
         desc_custom = lead.get("Project_Description") or ""
-        full_description = f"{desc_standard}\n{desc_custom}".strip() or "No description."
+        full_description = f"{desc_standard}\n{desc_custom}".strip()[:MAX_DESC_CHARS] or "No description."
 
-        # 2. LLM Analysis
-        prompt = f"""
-        Analyze this sales lead context and update status fields.
-        
+        # Keep the prompt within budget by dropping the oldest notes/emails first
+        notes_lines, emails_text_list = _fit_to_budget(full_description + last_reply_section, notes_lines, emails_text_list)
+        notes_text = "\n".join(notes_lines) or "No notes."
+        emails_text = "\n".join(emails_text_list) or "No emails."
+
+        return f"""
         LEAD: {lead.get('First_Name')} {lead.get('Last_Name')} ({lead.get('Company')})
         DESCRIPTION: {full_description}
         
@@ -866,7 +1613,64 @@ class ZohoAgentCore:
         RECENT EMAILS (Newest First):
         {emails_text}
         {last_reply_section}
+        """
+
+    def _apply_status_updates(self, lead, updates):
+        """Validates the AI's status fields and pushes them to Zoho; returns (success, result)."""
+        lead_id = lead.get("id")
+
+        # Validation & Formatting
+        zoho_update = {}
+        
+        if updates.get("last_conversation_summary"):
+            zoho_update["Last_Conversation"] = updates["last_conversation_summary"]
+        
+        if updates.get("last_conversation_date"):
+            # Basic validation of date format
+            d = updates["last_conversation_date"]
+            if len(d) == 10:
+                zoho_update["Last_Conversation_Date"] = f"{d}T09:00:00+05:30"
+        
+        if updates.get("next_action"):
+            zoho_update["Next_Action"] = updates["next_action"]
+        
+        if updates.get("next_action_date"):
+            d = updates["next_action_date"]
+            if len(d) == 10:
+                zoho_update["Next_Action_Date"] = f"{d}T09:00:00+05:30"
+
+        logger.info("✅ Calculated Updates for %s: %s", lead.get('Last_Name'), zoho_update)
+        
+        # 3. Push to Zoho
+        if zoho_update:
+            self.zoho.update_lead(lead_id, zoho_update)
+            self._invalidate(lead_id)
+            return True, zoho_update
+        else:
+            return True, "No updates needed" # Soft success
+
+    def update_lead_context(self, lead):
+        """
+        Analyzes full lead context (Desc, Notes, Emails) using LLM to update:
+        - Last_Conversation (Summary)
+        - Last_Conversation_Date
+        - Next_Action
+        - Next_Action_Date
+        """
+        logger.info("🔄 Analyzing context for %s...", lead.get('Last_Name'))
         
+        try:
+            # 1. Gather context; skip the LLM if nothing changed since the last analysis
+            lead_id = lead.get("id")
+            context_section = self._lead_context_section(lead)
+            sig = self._context_sig(context_section)
+            if self._context_unchanged(lead_id, sig):
+                return True, "Unchanged"
+
+            # 2. LLM Analysis
+            prompt = f"""
+        Analyze this sales lead context and update status fields.
+        {context_section}
         TASK:
         Based on the recent notes and emails (especially the Lead's last reply if present):
         1. Summarize the LAST interaction (email or note) into a short sentence. If the lead replied recently, focus on that over our automated follow-ups.
@@ -874,66 +1678,30 @@ class ZohoAgentCore:
         3. Propose the NEXT logical action (e.g., "Answer question about pricing", "Follow up on proposal") based on the lead's needs.
         4. Propose a date for that next action (YYYY-MM-DD).
         
-        OUTPUT JSON ONLY:
-        {{
-            "last_conversation_summary": "...",
-            "last_conversation_date": "YYYY-MM-DD",
-            "next_action": "...",
-            "next_action_date": "YYYY-MM-DD"
-        }}
+        Record the result with the update_lead_status tool.
         """
-        
-        try:
+
             model_name = ANTHROPIC_MODEL
             message = self.client.messages.create(
                 model=model_name,
                 max_tokens=200,
                 temperature=0.7,
+                tools=[LEAD_STATUS_TOOL],
+                tool_choice={"type": "tool", "name": LEAD_STATUS_TOOL["name"]},
                 messages=[{"role": "user", "content": prompt}]
             )
             
-            # Parse JSON
-            content = message.content[0].text
-            import re
-            json_match = re.search(r'{.*}', content, re.DOTALL)
-            if json_match:
-                updates = json.loads(json_match.group(0))
-                
-                # Validation & Formatting
-                zoho_update = {}
-                
-                if updates.get("last_conversation_summary"):
-                    zoho_update["Last_Conversation"] = updates["last_conversation_summary"]
-                
-                if updates.get("last_conversation_date"):
-                    # Basic validation of date format
-                    d = updates["last_conversation_date"]
-                    if len(d) == 10:
-                        zoho_update["Last_Conversation_Date"] = f"{d}T09:00:00+05:30"
-                
-                if updates.get("next_action"):
-                    zoho_update["Next_Action"] = updates["next_action"]
-                
-                if updates.get("next_action_date"):
-                    d = updates["next_action_date"]
-                    if len(d) == 10:
-                        zoho_update["Next_Action_Date"] = f"{d}T09:00:00+05:30"
-
-                print(f"✅ Calculated Updates for {lead.get('Last_Name')}: {zoho_update}")
-                
-                # 3. Push to Zoho
-                if zoho_update:
-                    self.zoho.update_lead(lead_id, zoho_update)
-                    return True, zoho_update
-                else:
-                    return True, "No updates needed" # Soft success
+            # The SDK returns the tool input already parsed
+            updates = next((b.input for b in message.content if b.type == "tool_use"), None)
+            if updates:
+                success, result = self._apply_status_updates(lead, updates)
+                self._remember_context(lead_id, sig)
+                return success, result
                     
-            return False, "Failed to parse AI response"
+            return False, "No status returned by AI"
             
         except Exception as e:
-            print(f"Error in update_lead_context: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error in update_lead_context: %s", e)
             return False, str(e)
 
 # Initialize Core Agent
@@ -946,7 +1714,7 @@ agent = ZohoAgentCore()
 def get_draft_blocks(lead, content, draft_id):
     """Constructs the Slack UI blocks for a draft."""
     # Clean body for Slack (strip basic HTML if present)
-    body_text = re.sub('<[^<]+?>', '', content['body']).strip()
+    body_text = content.get('body_plain') or _plain_body(content['body'])
     
     return [
         {
@@ -991,19 +1759,69 @@ def get_draft_blocks(lead, content, draft_id):
         }
     ]
 
+def _failed_generation_blocks(lead, draft_id):
+    return [
+        {"type": "section", "text": {"type": "mrkdwn", "text": f"⚠️ *Failed to generate email for {lead.get('First_Name')}*."}},
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "🔄 Try Again"},
+                    "action_id": "retry_generation",
+                    "value": draft_id
+                }
+            ]
+        }
+    ]
+
+def progress_updater(client, channel, ts, label):
+    """on_progress callback that refreshes a Slack placeholder while a draft streams in."""
+    def _update(text):
+        slack_updates.schedule_update(
+            client,
+            channel=channel,
+            ts=ts,
+            text=label,
+            blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": f"*{label}*\n_{len(text)} characters written..._"}}]
+        )
+    return _update
+
+def post_draft(client, channel, lead, plan, content, thread_ts=None):
+    """
+    Stores a generated draft and posts its card (or a "Try Again" card if generation
+    failed). Safe to run on a worker thread: errors are logged, not raised.
+    """
+    try:
+        # Store lead/plan even if content failed (mock content for id)
+        mock_content = content or {"subject": "Generation Error", "body": "Failed"}
+        draft_id = draft_manager.save_draft(lead, plan, mock_content)
+
+        if content:
+            blocks = get_draft_blocks(lead, content, draft_id)
+            draft_manager.record_blocks(draft_id, blocks)
+            client.chat_postMessage(channel=channel, thread_ts=thread_ts,
+                                    text=f"Draft for {lead.get('Last_Name')}", blocks=blocks)
+        else:
+            client.chat_postMessage(channel=channel, thread_ts=thread_ts,
+                                    text="⚠️ Generation Failed", blocks=_failed_generation_blocks(lead, draft_id))
+        return draft_id
+    except Exception:
+        logger.exception("Failed to post draft for lead %s", lead.get("id"))
+        return None
+
 @app.action("approve_draft")
 def handle_approval(ack, body, client):
     ack()
     draft_id = body['actions'][0]['value']
     
-    # DEBUG: Print ID and Keys
-    print(f"DEBUG: Processing Approval for Draft ID: {draft_id}")
-    print(f"DEBUG: Available Draft IDs: {list(draft_manager.drafts.keys())}")
+    logger.debug("Processing Approval for Draft ID: %s", draft_id)
+    logger.debug("Available Draft IDs: %s", draft_manager.drafts.keys())
     
     draft_data = draft_manager.get_draft(draft_id)
     
     if not draft_data:
-        print(f"DEBUG: Draft {draft_id} NOT FOUND.")
+        logger.warning("Draft %s NOT FOUND.", draft_id)
         client.chat_postMessage(channel=body['channel']['id'], text="⚠️ Draft expired or not found. Please regenerate.")
         return
 
@@ -1015,7 +1833,8 @@ def handle_approval(ack, body, client):
         ts = body['message']['ts']
         channel = body['channel']['id']
         try:
-            client.chat_update(
+            slack_updates.update_now(
+                client,
                 channel=channel,
                 ts=ts,
                 text="Email Sent ✅",
@@ -1030,7 +1849,7 @@ def handle_approval(ack, body, client):
                 ]
             )
         except Exception as e:
-            print(f"ERROR: Failed to update Slack message: {e}")
+            logger.error("Failed to update Slack message: %s", e)
             
         # Cleanup
         draft_manager.delete_draft(draft_id)
@@ -1064,23 +1883,17 @@ def handle_skip(ack, body, client):
 
     draft_data = draft_manager.get_draft(draft_id)
     if not draft_data:
-        client.chat_update(channel=channel, ts=ts, text="⚠️ Draft expired.")
+        slack_updates.update_now(client, channel=channel, ts=ts, text="⚠️ Draft expired.")
         return
 
     # Update Zoho
-    lead_id = draft_data['lead']['id']
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%dT09:00:00+05:30")
-    
     try:
-        agent.zoho.add_note(lead_id, "Agent: Draft Skipped via Slack. Rescheduled for tomorrow.")
-        agent.zoho.update_lead(lead_id, {
-            "Next_Action_Date": tomorrow,
-            "Next_Action": "Skipped - Retry Tomorrow"
-        })
+        agent.skip_lead(draft_data['lead']['id'])
     except Exception as e:
-        print(f"ERROR: Skip Action Failed: {e}")
+        logger.error("Skip Action Failed: %s", e)
     
-    client.chat_update(
+    slack_updates.update_now(
+        client,
         channel=channel,
         ts=ts,
         text="Skipped ⏭️",
@@ -1162,41 +1975,11 @@ def handle_check_leads(message, say):
 
     say(f"🚀 Found {len(leads)} leads. Generating drafts...")
     
-    for lead in leads:
-        plan = agent.determine_next_step(lead)
-        if plan['type'] == 'email':
-            # Try generation
-            content = agent.generate_email_content(lead, plan)
-            
-            # Store lead/plan even if content failed (mock content for id)
-            mock_content = content or {"subject": "Generation Error", "body": "Failed"}
-            draft_id = draft_manager.save_draft(lead, plan, mock_content)
-            
-            if content:
-                app.client.chat_postMessage(
-                    channel=message['channel'],
-                    text="Draft Email",
-                    blocks=get_draft_blocks(lead, content, draft_id)
-                )
-            else:
-                 app.client.chat_postMessage(
-                    channel=message['channel'],
-                    text="⚠️ Generation Failed",
-                    blocks=[
-                        {"type": "section", "text": {"type": "mrkdwn", "text": f"⚠️ *Failed to generate email for {lead.get('First_Name')}*."}},
-                        {
-                            "type": "actions",
-                            "elements": [
-                                {
-                                    "type": "button",
-                                    "text": {"type": "plain_text", "text": "🔄 Try Again"},
-                                    "action_id": "retry_generation",
-                                    "value": draft_id
-                                }
-                            ]
-                        }
-                    ]
-                )
+    # Slack posts overlap with generation of the remaining leads
+    with ThreadPoolExecutor(max_workers=SLACK_POST_WORKERS) as slack_posts:
+        for lead, plan, content in agent.prepare_drafts(leads):
+            if plan['type'] == 'email':
+                slack_posts.submit(post_draft, app.client, message['channel'], lead, plan, content)
 
 @app.action("retry_generation")
 def handle_retry_gen(ack, body, client):
@@ -1209,7 +1992,7 @@ def handle_retry_gen(ack, body, client):
     ts = body['message']['ts']
     channel = body['channel']['id']
     
-    client.chat_update(
+    slack_updates.schedule_update(client,
         channel=channel, 
         ts=ts, 
         text="🔄 Retrying...",
@@ -1218,22 +2001,26 @@ def handle_retry_gen(ack, body, client):
         ]
     )
     
-    content = agent.generate_email_content(draft_data['lead'], draft_data['plan'])
+    content = agent.generate_email_content(
+        draft_data['lead'], draft_data['plan'],
+        on_progress=progress_updater(client, channel, ts, "🔄 Retrying Generation...")
+    )
     
     if content:
         # Update draft
-        draft_manager.drafts[draft_id]['content'] = content
-        draft_manager._save_drafts()
+        draft_manager.set_content(draft_id, content)
+        blocks = get_draft_blocks(draft_data['lead'], content, draft_id)
+        draft_manager.record_blocks(draft_id, blocks)
         
-        client.chat_update(
+        slack_updates.schedule_update(client,
             channel=channel,
             ts=ts,
             text="Draft Generated",
-            blocks=get_draft_blocks(draft_data['lead'], content, draft_id)
+            blocks=blocks
         )
     else:
         # Failed again
-        client.chat_update(
+        slack_updates.schedule_update(client,
             channel=channel,
             ts=ts,
             text="⚠️ Failed Again",
@@ -1256,7 +2043,7 @@ def handle_retry_gen(ack, body, client):
 @app.view("submit_refinement")
 def handle_refinement(ack, body, client):
     ack()
-    metadata = json.loads(body['view']['private_metadata'])
+    metadata = _json_loads(body['view']['private_metadata'])
     draft_id = metadata['draft_id']
     feedback = body['view']['state']['values']['feedback_block']['feedback_input']['value']
     new_subject = body['view']['state']['values']['subject_block']['subject_input']['value']
@@ -1266,9 +2053,15 @@ def handle_refinement(ack, body, client):
     if not draft_data:
         return
 
+    if not feedback:
+        # Manual edits that change nothing: the message already shows this draft
+        edited = {"subject": new_subject, "body": new_body or ""}
+        if not draft_manager.record_blocks(draft_id, get_draft_blocks(draft_data['lead'], edited, draft_id)):
+            return
+
     # Notify processing
     loading_msg = "🔄 Regenerating via AI..." if feedback else "💾 Saving Edits..."
-    client.chat_update(
+    slack_updates.schedule_update(client,
         channel=metadata['channel'],
         ts=metadata['ts'],
         text=loading_msg,
@@ -1277,7 +2070,10 @@ def handle_refinement(ack, body, client):
 
     if feedback:
         # Regenerate entirely based on feedback
-        new_content = agent.generate_email_content(draft_data['lead'], draft_data['plan'], feedback)
+        new_content = agent.generate_email_content(
+            draft_data['lead'], draft_data['plan'], feedback,
+            on_progress=progress_updater(client, metadata['channel'], metadata['ts'], loading_msg)
+        )
     else:
         # Use manual edits
         new_content = {
@@ -1286,69 +2082,57 @@ def handle_refinement(ack, body, client):
         }
     
     # Update Draft Store (update existing ID)
-    draft_manager.drafts[draft_id]['content'] = new_content
-    draft_manager._save_drafts()
+    draft_manager.set_content(draft_id, new_content)
+    blocks = get_draft_blocks(draft_data['lead'], new_content, draft_id)
+    draft_manager.record_blocks(draft_id, blocks)
     
     # Repost new draft
-    client.chat_update(
+    slack_updates.schedule_update(client,
         channel=metadata['channel'],
         ts=metadata['ts'],
         text="Updated Draft",
-        blocks=get_draft_blocks(draft_data['lead'], new_content, draft_id)
+        blocks=blocks
     )
 
+def _start_queue_logging():
+    """
+    Routes log records through a queue so callers never block on stderr;
+    a QueueListener thread does the actual writes.
+    """
+    root = logging.getLogger()
+    log_queue = queue.Queue(-1)
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+
 def main():
     # On startup, check leads once (manual trigger mode)
-    print("🤖 Bot Started. Checking for pending leads...")
+    _start_queue_logging()
+    logger.info("🤖 Bot Started. Checking for pending leads...")
     leads = agent.fetch_pending_leads()
-    print(f"Found {len(leads)} leads.")
+    logger.info("Found %d leads.", len(leads))
     
     if leads:
         app.client.chat_postMessage(channel=SLACK_CHANNEL, text=f"🚀 *Daily Sales Plan*: Found {len(leads)} leads.")
         
-        for lead in leads:
-            plan = agent.determine_next_step(lead)
-            if plan['type'] == 'email':
-                print(f"Generating draft for {lead.get('Last_Name')}...")
-                content = agent.generate_email_content(lead, plan)
-                
-                mock_content = content or {"subject": "Generation Error", "body": "Failed"}
-                draft_id = draft_manager.save_draft(lead, plan, mock_content)
-
-                if content:
-                    # Post to Slack
-                    app.client.chat_postMessage(
-                        channel=SLACK_CHANNEL,
-                        text="Draft Email",
-                        blocks=get_draft_blocks(lead, content, draft_id)
-                    )
-                else:
-                    app.client.chat_postMessage(
-                        channel=SLACK_CHANNEL,
-                        text="⚠️ Generation Failed",
-                        blocks=[
-                            {"type": "section", "text": {"type": "mrkdwn", "text": f"⚠️ *Failed to generate email for {lead.get('First_Name')}*."}},
-                            {
-                                "type": "actions",
-                                "elements": [
-                                    {
-                                        "type": "button",
-                                        "text": {"type": "plain_text", "text": "🔄 Try Again"},
-                                        "action_id": "retry_generation",
-                                        "value": draft_id
-                                    }
-                                ]
-                            }
-                        ]
-                    )
+        with ThreadPoolExecutor(max_workers=SLACK_POST_WORKERS) as slack_posts:
+            for lead, plan, content in agent.prepare_drafts(leads):
+                if plan['type'] == 'email':
+                    logger.info("Generated draft for %s...", lead.get('Last_Name'))
+                    slack_posts.submit(post_draft, app.client, SLACK_CHANNEL, lead, plan, content)
     else:
-        print("No leads needed action.")
+        logger.info("No leads needed action.")
 
-    print("⚡️ Listening for Slack interactions...")
+    logger.info("⚡️ Listening for Slack interactions...")
     SocketModeHandler(app, SLACK_APP_TOKEN).start()
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
-        print("Exiting...")
+        logger.info("Exiting...")
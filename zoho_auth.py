@@ -11,6 +11,8 @@ If arguments are not provided, it will prompt for them.
 
 import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import urllib.parse
 import webbrowser
 import time
@@ -24,6 +26,20 @@ load_dotenv()
 DEFAULT_DOMAIN = "com"
 REDIRECT_URI = "http://localhost:8000/callback"  # Standard redirect URI for local apps
 SCOPES = "ZohoCRM.modules.ALL,ZohoCRM.users.READ"
+TIMEOUT = (5, 30)  # (connect, read) seconds
+
+def _session():
+    """
+    Session for the authorization-code exchange, which is not idempotent: once Zoho
+    has consumed the code a retry only yields invalid_code. So retry just failed
+    connections and 429s (both rejected before the code is used), never 5xx or read errors.
+    """
+    retry = Retry(total=5, connect=3, read=0, status=3, backoff_factor=1, status_forcelist=[429],
+                  allowed_methods=frozenset({"POST"}), respect_retry_after_header=True,
+                  raise_on_status=False)
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    return session
 
 def get_base_url(domain_suffix):
     return f"https://accounts.zoho.{domain_suffix}"
@@ -78,7 +94,8 @@ def generate_tokens(client_id, client_secret, auth_code, domain_suffix):
     print("="*60)
     
     try:
-        response = requests.post(url, params=params)
+        with _session() as session:
+            response = session.post(url, params=params, timeout=TIMEOUT)
         response.raise_for_status()
         data = response.json()
         
@@ -97,8 +114,8 @@ def generate_tokens(client_id, client_secret, auth_code, domain_suffix):
             
     except requests.exceptions.RequestException as e:
         print(f"Error generating tokens: {e}")
-        if response:
-            print(response.text)
+        if e.response is not None:
+            print(e.response.text)
 
 def main():
     print("Zoho CRM OAuth Setup")
@@ -1,7 +1,84 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import os
-from typing import Optional, Dict, List, Any
+import json
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, List, Any, Iterator
+
+try:
+    import orjson  # optional: faster parsing of large email/lead payloads
+except ImportError:
+    orjson = None
+
+try:
+    import httpx  # optional: HTTP/2 transport (needs the h2 package too)
+    import h2  # noqa: F401
+except ImportError:
+    httpx = None
+
+try:
+    import fcntl  # POSIX only; without it the token cache is used unlocked
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Access tokens are shared across processes/restarts via small files here
+TOKEN_CACHE_DIR = os.getenv("ZOHO_TOKEN_CACHE_DIR", os.path.expanduser("~/.cache/zoho/tokens"))
+
+# (connect, read) seconds for every Zoho call, so a stalled socket can't pin a pooled connection
+REQUEST_TIMEOUT = (5, 30)
+
+# Refresh the access token in the background this many seconds before it expires
+TOKEN_REFRESH_AHEAD = 300
+
+# Opt-in HTTP/2 (ZOHO_HTTP2=1): concurrent calls multiplex over one connection
+USE_HTTP2 = os.getenv("ZOHO_HTTP2", "").lower() in ("1", "true", "yes")
+
+# Transient statuses retried for idempotent methods (GET/PUT)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = frozenset({"GET", "PUT"})
+MAX_RETRIES = 5
+
+# Circuit breaker: after this many consecutive 429/5xx/connection failures,
+# fail fast for BREAKER_COOLDOWN seconds
+BREAKER_THRESHOLD = 10
+BREAKER_COOLDOWN = 60
+
+# Max record ids Zoho accepts in one ids= request
+BULK_IDS_LIMIT = 100
+
+# API domain marker -> accounts (OAuth) host, checked in order; default is .com
+ACCOUNTS_URLS = (
+    (".eu", "https://accounts.zoho.eu"),
+    (".in", "https://accounts.zoho.in"),
+    (".com.cn", "https://accounts.zoho.com.cn"),
+    (".com.au", "https://accounts.zoho.com.au"),
+)
+
+HTTP_ERRORS = (requests.exceptions.HTTPError,) + ((httpx.HTTPStatusError,) if httpx else ())
+TRANSPORT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout) + (
+    (httpx.TransportError,) if httpx else ())
+
+def _data_body(record: Dict[str, Any]) -> bytes:
+    """Serializes a single-record write body ({"data": [record]}) to JSON bytes."""
+    return b'{"data":[' + (orjson.dumps(record) if orjson else json.dumps(record).encode()) + b']}'
+
+class ZohoCircuitOpen(RuntimeError):
+    """Raised instead of calling Zoho while the circuit breaker is open."""
+
+def _json(response: requests.Response) -> Any:
+    """Parses a response body as JSON, via orjson when available."""
+    return orjson.loads(response.content) if orjson else response.json()
+
+def _debug_response(e: Exception) -> bool:
+    """True if e carries a response body worth logging and DEBUG logging is on."""
+    return (logger.isEnabledFor(logging.DEBUG)
+            and getattr(e, "response", None) is not None and bool(e.response.content))
 
 class ZohoClient:
     """
@@ -14,26 +91,77 @@ class ZohoClient:
         self.client_secret = client_secret
         self.api_domain = api_domain.rstrip('/')
         self.accounts_url = self._get_accounts_url(api_domain)
+        self._token_url = f"{self.accounts_url}/oauth/v2/token"
+
+        # Base URLs, built once; methods only append the dynamic parts
+        self._v2_url = f"{self.api_domain}/crm/v2"
+        self._leads_url = f"{self._v2_url}/Leads"
+        self._leads_v3_url = f"{self.api_domain}/crm/v3/Leads"
         
         # Token management
         self.access_token = None
         self.token_expiry = 0
-        
+        self._token_expiry_mono = 0.0  # 0 = no token yet
+        self._headers: Dict[str, str] = {}
+        self._token_lock = threading.Lock()
+        self._bg_refresh = threading.Lock()  # held while a background refresh runs
+        key = hashlib.sha256(f"{refresh_token}{client_id}".encode()).hexdigest()
+        self._token_cache_path = os.path.join(TOKEN_CACHE_DIR, f"{key}.json")
+
+        # owner_id -> user_id that last worked for email content (None = no user_id)
+        self._mailbox_user: Dict[str, Optional[str]] = {}
+
+        self._breaker_lock = threading.Lock()
+        self._breaker_failures = 0
+        self._breaker_opened_at = 0.0
+
+        # lead_id -> last fetched record, revalidated with If-Modified-Since
+        self._lead_cache: Dict[str, Dict[str, Any]] = {}
+        self._lead_cache_lock = threading.Lock()
+
+        # Reuse TCP/TLS connections across calls (keep-alive); transient 429/5xx
+        # responses are retried with exponential backoff, honoring Retry-After.
+        # POST (add_note, COQL) isn't retried: a 5xx may still have created the note.
+        retry = Retry(total=MAX_RETRIES, backoff_factor=1.0, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=RETRY_METHODS, respect_retry_after_header=True,
+                      raise_on_status=False)
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry))
+        self._session.headers["Content-Type"] = "application/json"
+        self._timeout = REQUEST_TIMEOUT
+
+        # With ZOHO_HTTP2 set (and httpx[http2] installed) CRM calls go over HTTP/2;
+        # the token endpoint stays on the requests session.
+        self._h2: Optional["httpx.Client"] = None
+        if USE_HTTP2:
+            if httpx:
+                self._h2 = httpx.Client(http2=True, timeout=30,
+                                        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16))
+            else:
+                logger.warning("ZOHO_HTTP2 is set but httpx[http2] is not installed; using HTTP/1.1")
+
+    def close(self):
+        """Closes pooled connections."""
+        self._session.close()
+        if self._h2 is not None:
+            self._h2.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def _get_accounts_url(self, api_domain: str) -> str:
         """Determines the accounts URL based on the API domain."""
-        if ".eu" in api_domain:
-            return "https://accounts.zoho.eu"
-        elif ".in" in api_domain:
-            return "https://accounts.zoho.in"
-        elif ".com.cn" in api_domain:
-            return "https://accounts.zoho.com.cn"
-        elif ".com.au" in api_domain:
-            return "https://accounts.zoho.com.au"
+        for marker, accounts_url in ACCOUNTS_URLS:
+            if marker in api_domain:
+                return accounts_url
         return "https://accounts.zoho.com"
 
     def _refresh_access_token(self):
         """Refreshes the OAuth access token."""
-        url = f"{self.accounts_url}/oauth/v2/token"
+        url = self._token_url
         params = {
             "refresh_token": self.refresh_token,
             "client_id": self.client_id,
@@ -41,117 +169,328 @@ class ZohoClient:
             "grant_type": "refresh_token"
         }
         
-        response = requests.post(url, params=params)
+        # Don't send the (expired) API token to the accounts server
+        response = self._session.post(url, params=params, headers={"Authorization": None}, timeout=self._timeout)
         response.raise_for_status()
-        data = response.json()
+        data = _json(response)
         
         if "error" in data:
             raise ValueError(f"Error refreshing token: {data.get('error')}")
             
-        self.access_token = data["access_token"]
         # Set expiry to now + expires_in (usually 3600s) - buffer
-        self.token_expiry = time.time() + data.get("expires_in", 3600) - 60
+        self._set_token(data["access_token"], data.get("expires_in", 3600) - 60)
 
-    def _get_headers(self) -> Dict[str, str]:
-        """Returns headers with valid access token."""
-        if not self.access_token or time.time() >= self.token_expiry:
+    def _set_token(self, access_token: str, ttl: float):
+        """
+        Installs a token valid for ttl more seconds. token_expiry is wall-clock
+        (it is shared via the disk cache); freshness checks use the monotonic copy.
+        """
+        self.access_token = access_token
+        self.token_expiry = time.time() + ttl
+        self._token_expiry_mono = time.monotonic() + ttl
+        self._headers = {"Authorization": f"Zoho-oauthtoken {access_token}", "Content-Type": "application/json"}
+        self._session.headers["Authorization"] = self._headers["Authorization"]
+
+    def _token_fresh(self, margin: float = 0) -> bool:
+        return time.monotonic() < self._token_expiry_mono - margin
+
+    def _load_cached_token(self, margin: float = 0) -> bool:
+        """Adopts a token written by another process if it is valid for margin more seconds."""
+        try:
+            with open(self._token_cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not cached.get("access_token") or time.time() >= cached.get("token_expiry", 0) - margin:
+            return False
+        self._set_token(cached["access_token"], cached["token_expiry"] - time.time())
+        return True
+
+    def _store_cached_token(self):
+        fd = os.open(self._token_cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"access_token": self.access_token, "token_expiry": self.token_expiry}, f)
+
+    def _ensure_token(self):
+        """
+        Makes sure a valid access token is loaded: memory, then the on-disk cache,
+        then a refresh. The refresh runs under a file lock with a re-check, so
+        concurrent processes (and threads) refresh only once. Close to expiry the
+        refresh is started in the background while callers keep the current token.
+        """
+        if self._token_fresh():
+            if not self._token_fresh(TOKEN_REFRESH_AHEAD) and self._bg_refresh.acquire(blocking=False):
+                threading.Thread(target=self._background_refresh, daemon=True).start()
+            return
+        with self._token_lock:
+            self._renew_token()
+
+    def _background_refresh(self):
+        try:
+            with self._token_lock:
+                self._renew_token(TOKEN_REFRESH_AHEAD)
+        except Exception as e:
+            # The foreground path retries once the token actually expires
+            logger.warning("Background token refresh failed: %s", e)
+        finally:
+            self._bg_refresh.release()
+
+    def _renew_token(self, margin: float = 0):
+        """Loads or refreshes a token valid for margin more seconds. Caller holds _token_lock."""
+        if self._token_fresh(margin) or self._load_cached_token(margin):
+            return
+        try:
+            os.makedirs(TOKEN_CACHE_DIR, exist_ok=True)
+            lock_file = open(self._token_cache_path + ".lock", "w")
+        except OSError as e:
+            # e.g. read-only filesystem: no sharing, just refresh
+            logger.debug("Token cache unavailable: %s", e)
             self._refresh_access_token()
-        return {
-            "Authorization": f"Zoho-oauthtoken {self.access_token}",
-            "Content-Type": "application/json"
-        }
+            return
+        with lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self._load_cached_token(margin):
+                return
+            self._refresh_access_token()
+            try:
+                self._store_cached_token()
+            except OSError as e:
+                logger.debug("Could not write token cache: %s", e)
+
+    def _get_headers(self) -> Dict[str, str]:
+        """Returns headers with valid access token (shared dict; don't mutate)."""
+        self._ensure_token()
+        return self._headers
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request on the pooled session (auth headers are session defaults).
+        Retries happen in the adapter; raises requests.HTTPError if the final response is an error,
+        or ZohoCircuitOpen without sending anything while Zoho is failing persistently.
+        timeout defaults to REQUEST_TIMEOUT (connect, read); pass timeout=... to override.
+        """
+        self._check_breaker()
+        self._ensure_token()
+        kwargs.setdefault("timeout", self._timeout)
+        try:
+            if self._h2 is not None:
+                response = self._request_h2(method, url, **kwargs)
+            else:
+                response = self._session.request(method, url, **kwargs)
+        except TRANSPORT_ERRORS:
+            self._record_outcome(False)
+            raise
+        self._record_outcome(response.status_code not in RETRY_STATUSES)
+        # 304 answers a conditional GET; httpx's raise_for_status would treat it as an error
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    def _check_breaker(self):
+        with self._breaker_lock:
+            if self._breaker_failures < BREAKER_THRESHOLD:
+                return
+            remaining = self._breaker_opened_at + BREAKER_COOLDOWN - time.monotonic()
+        if remaining > 0:
+            raise ZohoCircuitOpen(f"Zoho API failing; skipping calls for another {remaining:.0f}s")
+        # Cool-down over: let calls through; one more failure re-opens the circuit
+
+    def _record_outcome(self, ok: bool):
+        with self._breaker_lock:
+            if ok:
+                self._breaker_failures = 0
+                return
+            self._breaker_failures += 1
+            if self._breaker_failures >= BREAKER_THRESHOLD:
+                if self._breaker_failures == BREAKER_THRESHOLD:
+                    logger.warning("Zoho circuit opened after %d consecutive failures", BREAKER_THRESHOLD)
+                self._breaker_opened_at = time.monotonic()
 
-    def get_leads(self, per_page=200) -> List[Dict[str, Any]]:
+    def _request_h2(self, method: str, url: str, **kwargs) -> "httpx.Response":
+        """
+        HTTP/2 variant of the session call. httpx has no status-based retries, so the
+        adapter's policy (retry GET/PUT on 429/5xx, honoring Retry-After) is applied here.
+        _request's raise_for_status then raises httpx.HTTPStatusError, which carries
+        .response like requests' HTTPError.
+        """
+        if isinstance(kwargs.get("timeout"), tuple):
+            connect, read = kwargs["timeout"]
+            kwargs["timeout"] = httpx.Timeout(read, connect=connect)
+        # httpx wants raw bodies as content= (bytes in data= is deprecated)
+        if isinstance(kwargs.get("data"), (bytes, str)):
+            kwargs["content"] = kwargs.pop("data")
+        for attempt in range(MAX_RETRIES + 1):
+            headers = {**self._get_headers(), **(kwargs.get("headers") or {})}
+            response = self._h2.request(method, url, **{**kwargs, "headers": headers})
+            if (response.status_code not in RETRY_STATUSES or method not in RETRY_METHODS
+                    or attempt == MAX_RETRIES):
+                break
+            try:
+                delay = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                delay = 2 ** attempt
+            time.sleep(min(delay, 60))
+        return response
+
+    def get_leads(self, per_page=200, page=1, criteria: Optional[str] = None,
+                  fields: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Fetches a list of leads from Zoho CRM.
+        If criteria is given, filtering is done server-side via the search API.
+        fields (comma-separated API names) narrows the returned columns.
         """
-        url = f"{self.api_domain}/crm/v2/Leads"
-        params = {"per_page": per_page}
+        if criteria:
+            return self.get_leads_by_criteria(criteria, per_page=per_page, page=page, fields=fields)
+
+        url = self._leads_url
+        params = {"per_page": per_page, "page": page}
+        if fields:
+            params["fields"] = fields
         
-        response = requests.get(url, headers=self._get_headers(), params=params)
+        response = self._request("GET", url, params=params)
         
         if response.status_code == 204:
             return []
             
-        response.raise_for_status()
-        return response.json().get("data", [])
+        return _json(response).get("data", [])
 
-    def get_leads_by_criteria(self, criteria: str) -> List[Dict[str, Any]]:
+    def iter_leads(self, page_size: int = 200, criteria: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields leads page by page until Zoho reports no more records, so callers
+        can start work before pagination finishes and hold only one page at a time.
+        """
+        page = 1
+        while True:
+            url = self._leads_url + "/search" if criteria else self._leads_url
+            params: Dict[str, Any] = {"per_page": page_size, "page": page}
+            if criteria:
+                params["criteria"] = criteria
+            response = self._request("GET", url, params=params)
+            if response.status_code == 204:
+                return
+            payload = _json(response)
+            yield from payload.get("data", [])
+            if not payload.get("info", {}).get("more_records"):
+                return
+            page += 1
+
+    def get_leads_by_criteria(self, criteria: str, per_page=200, page=1,
+                              fields: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Search for leads matching specific criteria.
         Example criteria: '(Email:equals:test@example.com)'
         """
-        url = f"{self.api_domain}/crm/v2/Leads/search"
-        params = {"criteria": criteria}
-        
-        response = requests.get(url, headers=self._get_headers(), params=params)
+        url = self._leads_url + "/search"
+        params = {"criteria": criteria, "per_page": per_page, "page": page}
+        if fields:
+            params["fields"] = fields
+
+        try:
+            response = self._request("GET", url, params=params)
+        except HTTP_ERRORS as e:
+            logger.error("Zoho Search Error: %s", e)
+            logger.error("Response: %s", e.response.text)
+            raise e
         
         if response.status_code == 204: # No content
             return []
             
-        try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            print(f"Zoho Search Error: {e}")
-            if response:
-                print(f"Response: {response.text}")
-            raise e
-            
-        return response.json().get("data", [])
+        return _json(response).get("data", [])
 
     def get_lead_details(self, lead_id: str) -> Dict[str, Any]:
-        """Fetch full details for a specific lead."""
-        url = f"{self.api_domain}/crm/v2/Leads/{lead_id}"
-        response = requests.get(url, headers=self._get_headers())
-        response.raise_for_status()
-        data = response.json().get("data", [])
-        return data[0] if data else {}
+        """
+        Fetch full details for a specific lead.
+        Repeat fetches send If-Modified-Since (the cached Modified_Time); on 304 the cached copy is returned.
+        """
+        url = f"{self._leads_url}/{lead_id}"
+        with self._lead_cache_lock:
+            cached = self._lead_cache.get(lead_id)
+        headers = {"If-Modified-Since": cached["Modified_Time"]} if cached else None
+        response = self._request("GET", url, headers=headers)
+        # Callers get copies, so their edits never leak into later 304 results
+        if response.status_code == 304 and cached:
+            return dict(cached)
+        data = _json(response).get("data", [])
+        lead = data[0] if data else {}
+        if lead.get("Modified_Time"):
+            with self._lead_cache_lock:
+                if len(self._lead_cache) >= 1000 and lead_id not in self._lead_cache:
+                    self._lead_cache.pop(next(iter(self._lead_cache)))
+                self._lead_cache[lead_id] = lead
+            return dict(lead)
+        return lead
 
-    def get_notes(self, parent_id: str, module: str = "Leads") -> List[Dict[str, Any]]:
-        """Fetch notes associated with a record."""
-        url = f"{self.api_domain}/crm/v2/{module}/{parent_id}/Notes"
+    def get_leads_bulk(self, lead_ids: List[str], fields: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch many leads by id, 100 per request (Zoho's ids= limit).
+        Leads that no longer exist are simply absent from the result.
+        """
+        url = self._leads_url
+        leads: List[Dict[str, Any]] = []
+        for start in range(0, len(lead_ids), BULK_IDS_LIMIT):
+            params = {"ids": ",".join(lead_ids[start:start + BULK_IDS_LIMIT])}
+            if fields:
+                params["fields"] = fields
+            response = self._request("GET", url, params=params)
+            if response.status_code == 204:
+                continue
+            leads.extend(_json(response).get("data", []))
+        return leads
+
+    def coql_query(self, select_query: str) -> List[Dict[str, Any]]:
+        """
+        Runs a COQL query (server-side filtering and field selection).
+        Example: "select Last_Name, Email from Leads where Lead_Status = 'New' limit 200"
+        Needs the ZohoCRM.coql.READ scope, which zoho_auth.py does not request by default.
+        """
+        url = self._v2_url + "/coql"
+        response = self._request("POST", url, json={"select_query": select_query})
+
+        if response.status_code == 204:
+            return []
+
+        return _json(response).get("data", [])
+
+    def get_notes(self, parent_id: str, module: str = "Leads", fields: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch notes associated with a record.
+        fields (comma-separated API names) limits the returned columns.
+        """
+        url = f"{self._v2_url}/{module}/{parent_id}/Notes"
         params = {"sort_by": "Created_Time", "sort_order": "desc", "per_page": 10}
+        if fields:
+            params["fields"] = fields
         
-        response = requests.get(url, headers=self._get_headers(), params=params)
+        response = self._request("GET", url, params=params)
         
         if response.status_code == 204:
             return []
             
-        response.raise_for_status()
-        return response.json().get("data", [])
+        return _json(response).get("data", [])
 
     def add_note(self, parent_id: str, note_content: str, module: str = "Leads") -> bool:
         """Add a note to a record."""
-        url = f"{self.api_domain}/crm/v2/{module}/{parent_id}/Notes"
-        payload = {
-            "data": [
-                 {
-                    "Note_Content": note_content,
-                    "Parent_Id": parent_id,
-                    "se_module": module
-                }
-            ]
-        }
-        
-        response = requests.post(url, headers=self._get_headers(), json=payload)
-        response.raise_for_status()
-        result = response.json().get("data", [])[0]
+        url = f"{self._v2_url}/{module}/{parent_id}/Notes"
+        body = _data_body({"Note_Content": note_content, "Parent_Id": parent_id, "se_module": module})
+
+        # Content-Type: application/json is a session default
+        response = self._request("POST", url, data=body)
+        result = _json(response).get("data", [])[0]
         return result.get("code") == "SUCCESS"
 
+    # Keys Zoho uses for email rows, in priority order
+    _EMAIL_KEYS = ("Emails", "email_related_list", "data")
+
     def _extract_email_rows(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Zoho email APIs can return different keys by endpoint/region/version.
         Normalize both to a list of email rows.
         """
-        rows = payload.get("Emails")
-        if isinstance(rows, list):
-            return rows
-        rows = payload.get("email_related_list")
-        if isinstance(rows, list):
-            return rows
-        rows = payload.get("data")
-        if isinstance(rows, list):
-            return rows
+        for key in self._EMAIL_KEYS:
+            rows = payload.get(key)
+            if type(rows) is list:
+                return rows
         return []
 
     def get_emails(self, lead_id: str, limit: int = 20) -> List[Dict[str, Any]]:
@@ -159,86 +498,106 @@ class ZohoClient:
         Fetch emails associated with a lead.
         Paginates using Zoho's index cursor when available.
         """
-        url = f"{self.api_domain}/crm/v3/Leads/{lead_id}/Emails"
+        return list(self.iter_emails(lead_id, limit=max(limit, 1)))[:limit]
+
+    def iter_emails(self, lead_id: str, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields a lead's emails newest first, page by page, following the index cursor.
+        Stops after limit rows (all rows if None); an HTTP error response ends the
+        iteration, while ZohoCircuitOpen and connection/timeout errors are raised.
+        """
+        url = f"{self._leads_v3_url}/{lead_id}/Emails"
         next_index: Optional[str] = None
-        collected: List[Dict[str, Any]] = []
+        remaining = limit
 
-        while len(collected) < max(limit, 1):
+        while remaining is None or remaining > 0:
+            # Ask only for what is still missing (Zoho's floor is 10 rows, cap 200)
             params: Dict[str, Any] = {
                 "sort_by": "Message_Time",
                 "sort_order": "desc",
-                "per_page": min(200, max(limit, 10)),
+                "per_page": 200 if remaining is None else min(200, max(remaining, 10)),
             }
             if next_index:
                 params["index"] = next_index
 
-            response = requests.get(url, headers=self._get_headers(), params=params)
-            if response.status_code == 204:
-                break
-
             try:
-                response.raise_for_status()
-                payload = response.json()
-                rows = self._extract_email_rows(payload)
-                if not rows:
-                    break
-                collected.extend(rows)
-
-                info = payload.get("info", {}) if isinstance(payload, dict) else {}
-                more_records = bool(info.get("more_records"))
-                next_index = info.get("next_index")
-                if not more_records or not next_index:
-                    break
-            except Exception as e:
-                print(f"DEBUG: Error fetching emails for {lead_id}: {e}")
-                if response.content:
-                    print(f"DEBUG: Response Content: {response.content}")
-                break
+                response = self._request("GET", url, params=params)
+                if response.status_code == 204:
+                    return
+                payload = _json(response)
+            except HTTP_ERRORS as e:
+                # ZohoCircuitOpen and transport errors propagate: an outage must not
+                # look like "no emails" to the reply-detection logic
+                logger.debug("Error fetching emails for %s: %s", lead_id, e, exc_info=e)
+                if _debug_response(e):
+                    logger.debug("Response Content: %s", e.response.content)
+                return
+
+            rows = self._extract_email_rows(payload)
+            if not rows:
+                return
+            if remaining is not None:
+                rows = rows[:remaining]
+                remaining -= len(rows)
+            yield from rows
 
-        return collected[:limit]
+            info = payload.get("info", {}) if isinstance(payload, dict) else {}
+            next_index = info.get("next_index")
+            if not info.get("more_records") or not next_index:
+                return
 
     def get_email_content(self, lead_id: str, message_id: str, owner_id: Optional[str] = None) -> str:
         """
         Fetch full content for a specific email.
         For shared mailboxes, Zoho may require user_id (owner id) on this endpoint.
         """
-        url = f"{self.api_domain}/crm/v3/Leads/{lead_id}/Emails/{message_id}"
-        user_ids_to_try: List[Optional[str]] = [None]
-        if owner_id:
-            user_ids_to_try.append(owner_id)
-
+        url = f"{self._leads_v3_url}/{lead_id}/Emails/{message_id}"
         last_error = None
-        for user_id in user_ids_to_try:
+        for user_id in self._mailbox_user_order(owner_id):
             params = {"user_id": user_id} if user_id else None
             try:
-                response = requests.get(url, headers=self._get_headers(), params=params)
-                response.raise_for_status()
-                rows = self._extract_email_rows(response.json())
+                response = self._request("GET", url, params=params)
+                if owner_id:
+                    self._remember_mailbox_user(owner_id, user_id)
+                rows = self._extract_email_rows(_json(response))
                 if rows and isinstance(rows[0], dict):
                     return rows[0].get("content", "") or ""
                 return ""
-            except Exception as e:
+            except HTTP_ERRORS as e:
                 last_error = e
-                if hasattr(e, "response") and e.response is not None and e.response.content:
-                    print(f"DEBUG: View email error ({message_id}, user_id={user_id}): {e.response.content}")
+                if _debug_response(e):
+                    logger.debug("View email error (%s, user_id=%s): %s", message_id, user_id, e.response.content)
 
-        print(f"DEBUG: Error fetching email content for {message_id}: {last_error}")
+        logger.debug("Error fetching email content for %s: %s", message_id, last_error)
         return ""
 
+    def _mailbox_user_order(self, owner_id: Optional[str]) -> List[Optional[str]]:
+        """user_ids to try for email content, the one that last worked for this owner first."""
+        if not owner_id:
+            return [None]
+        if self._mailbox_user.get(owner_id) == owner_id:
+            return [owner_id, None]
+        return [None, owner_id]
+
+    def _remember_mailbox_user(self, owner_id: str, user_id: Optional[str]):
+        if len(self._mailbox_user) >= 1000 and owner_id not in self._mailbox_user:
+            self._mailbox_user.pop(next(iter(self._mailbox_user)))
+        self._mailbox_user[owner_id] = user_id
+
     def update_lead(self, lead_id: str, data: Dict[str, Any]) -> bool:
         """Update a lead's fields."""
-        url = f"{self.api_domain}/crm/v2/Leads/{lead_id}"
-        payload = {"data": [data]}
-        
-        response = requests.put(url, headers=self._get_headers(), json=payload)
-        response.raise_for_status()
-        result_data = response.json().get("data", [])
+        url = f"{self._leads_url}/{lead_id}"
+        with self._lead_cache_lock:
+            self._lead_cache.pop(lead_id, None)
+
+        response = self._request("PUT", url, data=_data_body(data))
+        result_data = _json(response).get("data", [])
         if not result_data:
-            print("DEBUG: No data returned in update_lead response.")
+            logger.warning("No data returned in update_lead response.")
             return False
             
         result = result_data[0]
         if result.get("code") != "SUCCESS":
-            print(f"DEBUG: Zoho Update Error Response: {result}")
+            logger.warning("Zoho Update Error Response: %s", result)
             
         return result.get("code") == "SUCCESS"
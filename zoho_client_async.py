@@ -0,0 +1,222 @@
+import asyncio
+import time
+import logging
+from typing import Optional, Dict, List, Any, Iterable
+
+import aiohttp
+
+from zoho_client import ZohoClient, BULK_IDS_LIMIT
+
+logger = logging.getLogger(__name__)
+
+class AsyncZohoClient:
+    """
+    asyncio mirror of ZohoClient built on one aiohttp session.
+    Use it to fan out per-lead reads with asyncio.gather, e.g.:
+
+        async with AsyncZohoClient(refresh_token, client_id, client_secret) as z:
+            details = await z.get_details_bulk(lead_ids)
+
+    Library-only: the agent and Slack handler use the sync ZohoClient from thread pools.
+    """
+    # Same region mapping and payload normalization as the sync client
+    _get_accounts_url = ZohoClient._get_accounts_url
+    _EMAIL_KEYS = ZohoClient._EMAIL_KEYS
+    _extract_email_rows = ZohoClient._extract_email_rows
+    _mailbox_user_order = ZohoClient._mailbox_user_order
+    _remember_mailbox_user = ZohoClient._remember_mailbox_user
+
+    def __init__(self, refresh_token: str, client_id: str, client_secret: str,
+                 api_domain: str = "https://www.zohoapis.com", max_concurrency: int = 16):
+        self.refresh_token = refresh_token
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_domain = api_domain.rstrip('/')
+        self.accounts_url = self._get_accounts_url(api_domain)
+
+        # Token management
+        self.access_token = None
+        self.token_expiry = 0
+        self._token_lock = asyncio.Lock()
+        self._mailbox_user: Dict[str, Optional[str]] = {}
+
+        # Bounds in-flight requests so fanouts stay under Zoho's rate limits
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so the session binds to the running event loop
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=60, connect=5),
+            )
+        return self._session
+
+    async def _refresh_access_token(self):
+        """Refreshes the OAuth access token."""
+        url = f"{self.accounts_url}/oauth/v2/token"
+        params = {
+            "refresh_token": self.refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "refresh_token"
+        }
+        async with self._get_session().post(url, params=params) as response:
+            response.raise_for_status()
+            data = await response.json()
+
+        if "error" in data:
+            raise ValueError(f"Error refreshing token: {data.get('error')}")
+
+        self.access_token = data["access_token"]
+        self.token_expiry = time.time() + data.get("expires_in", 3600) - 60
+
+    async def _get_headers(self) -> Dict[str, str]:
+        """Returns headers with valid access token (one refresh even under concurrent callers)."""
+        if not self.access_token or time.time() >= self.token_expiry:
+            async with self._token_lock:
+                if not self.access_token or time.time() >= self.token_expiry:
+                    await self._refresh_access_token()
+        return {
+            "Authorization": f"Zoho-oauthtoken {self.access_token}",
+            "Content-Type": "application/json"
+        }
+
+    async def _request(self, method: str, url: str, **kwargs) -> Optional[Any]:
+        """Sends an authenticated request; returns parsed JSON, or None for 204 No Content."""
+        headers = await self._get_headers()
+        async with self._semaphore:
+            async with self._get_session().request(method, url, headers=headers, **kwargs) as response:
+                if response.status == 204:
+                    return None
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def get_leads(self, per_page=200, page=1) -> List[Dict[str, Any]]:
+        """Fetches a list of leads from Zoho CRM."""
+        payload = await self._request("GET", f"{self.api_domain}/crm/v2/Leads",
+                                      params={"per_page": per_page, "page": page})
+        return (payload or {}).get("data", [])
+
+    async def get_lead_details(self, lead_id: str) -> Dict[str, Any]:
+        """Fetch full details for a specific lead."""
+        payload = await self._request("GET", f"{self.api_domain}/crm/v2/Leads/{lead_id}")
+        data = (payload or {}).get("data", [])
+        return data[0] if data else {}
+
+    async def get_leads_bulk(self, lead_ids: List[str], fields: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch many leads by id, 100 per request, with the chunks fetched concurrently."""
+        async def _chunk(ids):
+            params = {"ids": ",".join(ids)}
+            if fields:
+                params["fields"] = fields
+            payload = await self._request("GET", f"{self.api_domain}/crm/v2/Leads", params=params)
+            return (payload or {}).get("data", [])
+        chunks = [lead_ids[i:i + BULK_IDS_LIMIT] for i in range(0, len(lead_ids), BULK_IDS_LIMIT)]
+        results = await asyncio.gather(*(_chunk(c) for c in chunks))
+        return [lead for chunk in results for lead in chunk]
+
+    async def get_notes(self, parent_id: str, module: str = "Leads", fields: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch notes associated with a record."""
+        params = {"sort_by": "Created_Time", "sort_order": "desc", "per_page": 10}
+        if fields:
+            params["fields"] = fields
+        payload = await self._request("GET", f"{self.api_domain}/crm/v2/{module}/{parent_id}/Notes", params=params)
+        return (payload or {}).get("data", [])
+
+    async def get_emails(self, lead_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Fetch emails associated with a lead (follows Zoho's index cursor)."""
+        url = f"{self.api_domain}/crm/v3/Leads/{lead_id}/Emails"
+        next_index: Optional[str] = None
+        collected: List[Dict[str, Any]] = []
+
+        while len(collected) < max(limit, 1):
+            # Ask only for what is still missing (Zoho's floor is 10 rows, cap 200)
+            params: Dict[str, Any] = {
+                "sort_by": "Message_Time",
+                "sort_order": "desc",
+                "per_page": min(200, max(limit - len(collected), 10)),
+            }
+            if next_index:
+                params["index"] = next_index
+            try:
+                payload = await self._request("GET", url, params=params)
+            except aiohttp.ClientResponseError as e:
+                # Connection errors and timeouts propagate, as in ZohoClient.iter_emails:
+                # an outage must not look like "no emails"
+                logger.debug("Error fetching emails for %s: %s", lead_id, e)
+                break
+            if not payload:
+                break
+            rows = self._extract_email_rows(payload)
+            if not rows:
+                break
+            collected.extend(rows)
+
+            info = payload.get("info", {}) if isinstance(payload, dict) else {}
+            next_index = info.get("next_index")
+            if not info.get("more_records") or not next_index:
+                break
+
+        return collected[:limit]
+
+    async def get_email_content(self, lead_id: str, message_id: str, owner_id: Optional[str] = None) -> str:
+        """Fetch full content for a specific email (retrying with the owner's user_id for shared mailboxes)."""
+        url = f"{self.api_domain}/crm/v3/Leads/{lead_id}/Emails/{message_id}"
+        last_error = None
+        for user_id in self._mailbox_user_order(owner_id):
+            params = {"user_id": user_id} if user_id else None
+            try:
+                payload = await self._request("GET", url, params=params)
+                if owner_id:
+                    self._remember_mailbox_user(owner_id, user_id)
+                rows = self._extract_email_rows(payload or {})
+                if rows and isinstance(rows[0], dict):
+                    return rows[0].get("content", "") or ""
+                return ""
+            except aiohttp.ClientResponseError as e:
+                last_error = e
+        logger.debug("Error fetching email content for %s: %s", message_id, last_error)
+        return ""
+
+    async def update_lead(self, lead_id: str, data: Dict[str, Any]) -> bool:
+        """Update a lead's fields."""
+        payload = await self._request("PUT", f"{self.api_domain}/crm/v2/Leads/{lead_id}", json={"data": [data]})
+        result_data = (payload or {}).get("data", [])
+        return bool(result_data) and result_data[0].get("code") == "SUCCESS"
+
+    async def add_note(self, parent_id: str, note_content: str, module: str = "Leads") -> bool:
+        """Add a note to a record."""
+        body = {"data": [{"Note_Content": note_content, "Parent_Id": parent_id, "se_module": module}]}
+        payload = await self._request("POST", f"{self.api_domain}/crm/v2/{module}/{parent_id}/Notes", json=body)
+        result_data = (payload or {}).get("data", [])
+        return bool(result_data) and result_data[0].get("code") == "SUCCESS"
+
+    # ------------------------------------------
+    # Fanout helpers
+    # ------------------------------------------
+
+    async def get_details_bulk(self, lead_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """Fetches details for many leads via ids= batches (order matches lead_ids, {} if missing)."""
+        lead_ids = list(lead_ids)
+        by_id = {lead.get("id"): lead for lead in await self.get_leads_bulk(lead_ids)}
+        return [by_id.get(i, {}) for i in lead_ids]
+
+    async def get_context_bulk(self, lead_ids: Iterable[str], email_limit: int = 20) -> List[Dict[str, Any]]:
+        """Fetches notes and emails for many leads concurrently: [{"notes": [...], "emails": [...]}]."""
+        async def _one(lead_id):
+            notes, emails = await asyncio.gather(self.get_notes(lead_id), self.get_emails(lead_id, limit=email_limit))
+            return {"notes": notes, "emails": emails}
+        return await asyncio.gather(*(_one(i) for i in lead_ids))